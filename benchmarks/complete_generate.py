@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import json
+import os
+import resource
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from hashlib import sha256
+from tempfile import TemporaryDirectory
+
+import layer_publisher.generate.complete_generate as complete_generate
+from benchmarks.synthetic import SyntheticCatalog
+from layer_publisher.utils.variables import FILE_SOURCE_DATA
+
+
+def parse_args():
+    parser = ArgumentParser(description="benchmark complete_generate.aggregate_layers")
+    parser.add_argument("--regions", type=int, default=30)
+    parser.add_argument("--layers", type=int, default=100)
+    parser.add_argument("--versions", type=int, default=10)
+    parser.add_argument("--output-format", default="json")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--output", default=None)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    catalog = SyntheticCatalog(
+        regions=args.regions,
+        layers_per_region=args.layers,
+        versions_per_layer=args.versions,
+    )
+
+    cwd = os.getcwd()
+    runs = []
+    with TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            catalog.write_layers_tree(
+                base_dir="layers", output_format=args.output_format
+            )
+            for _ in range(args.repeat):
+                if args.tracemalloc:
+                    tracemalloc.start()
+                started_at = time.perf_counter()
+                cpu_started_at = time.process_time()
+                complete_generate.aggregate_layers(workers=args.workers)
+                runs.append(
+                    {
+                        "wall_seconds": round(time.perf_counter() - started_at, 3),
+                        "cpu_seconds": round(time.process_time() - cpu_started_at, 3),
+                        "traced_peak_bytes": tracemalloc.get_traced_memory()[1]
+                        if args.tracemalloc
+                        else None,
+                    }
+                )
+                if args.tracemalloc:
+                    tracemalloc.stop()
+            with open(FILE_SOURCE_DATA, "rb") as f:
+                digest = sha256(f.read()).hexdigest()
+        finally:
+            os.chdir(cwd)
+
+    result = {
+        "benchmark": "complete_generate",
+        "params": vars(args),
+        "layer_versions": args.regions * args.layers * args.versions,
+        "runs": runs,
+        "best_wall_seconds": min(x["wall_seconds"] for x in runs),
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "source_data_sha256": digest,
+    }
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
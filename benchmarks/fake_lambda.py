@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import time
+from collections import Counter
+from threading import Lock
+
+from botocore.exceptions import ClientError
+
+from benchmarks.synthetic import SyntheticCatalog
+
+
+class ApiCallCounter:
+    def __init__(self):
+        self.lock = Lock()
+        self.calls: Counter[str] = Counter()
+        self.throttles = 0
+
+    def count(self, *, operation: str):
+        with self.lock:
+            self.calls[operation] += 1
+
+    def count_throttle(self):
+        with self.lock:
+            self.throttles += 1
+
+
+class FakeLambdaClient:
+    # in-process list_layers / list_layer_versions with NextMarker paging.
+    # more than max_concurrent_calls calls in flight raise
+    # TooManyRequestsException, like the real per-account limit
+    def __init__(
+        self,
+        *,
+        catalog: SyntheticCatalog,
+        region: str,
+        counter: ApiCallCounter,
+        latency: float = 0.0,
+        page_size: int = 50,
+        max_concurrent_calls: int | None = None,
+    ):
+        self.catalog = catalog
+        self.region = region
+        self.counter = counter
+        self.latency = latency
+        self.page_size = page_size
+        self.max_concurrent_calls = max_concurrent_calls
+        self.lock = Lock()
+        self.in_flight = 0
+
+    def _enter(self, *, operation: str):
+        self.counter.count(operation=operation)
+        with self.lock:
+            self.in_flight += 1
+            throttled = (
+                self.max_concurrent_calls is not None
+                and self.in_flight > self.max_concurrent_calls
+            )
+        if throttled:
+            self._exit()
+            self.counter.count_throttle()
+            raise ClientError(
+                {
+                    "Error": {
+                        "Code": "TooManyRequestsException",
+                        "Message": "Rate exceeded",
+                    },
+                    "ResponseMetadata": {"HTTPStatusCode": 429},
+                },
+                operation,
+            )
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _exit(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def _page(self, *, items: list, marker: str | None) -> tuple[list, dict]:
+        start = int(marker or 0)
+        end = start + self.page_size
+        extra = {"NextMarker": str(end)} if end < len(items) else {}
+        return items[start:end], extra
+
+    def list_layers(self, *, Marker: str | None = None) -> dict:
+        self._enter(operation="ListLayers")
+        try:
+            indexes, extra = self._page(
+                items=range(self.catalog.layers_per_region), marker=Marker
+            )
+            return {
+                "Layers": [
+                    self.catalog.generate_layer(region=self.region, index=x)
+                    for x in indexes
+                ],
+                **extra,
+            }
+        finally:
+            self._exit()
+
+    def list_layer_versions(self, *, LayerName: str, Marker: str | None = None) -> dict:
+        self._enter(operation="ListLayerVersions")
+        try:
+            index = self.catalog.layer_indexes[LayerName]
+            versions, extra = self._page(
+                items=range(self.catalog.versions_per_layer, 0, -1), marker=Marker
+            )
+            return {
+                "LayerVersions": [
+                    self.catalog.generate_version(
+                        region=self.region, index=index, version=x
+                    )
+                    for x in versions
+                ],
+                **extra,
+            }
+        finally:
+            self._exit()
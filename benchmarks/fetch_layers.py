@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import json
+import os
+import resource
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+
+import layer_publisher.generate.fetch_layers as fetch_layers
+from benchmarks.fake_lambda import ApiCallCounter, FakeLambdaClient
+from benchmarks.synthetic import SyntheticCatalog
+
+
+def parse_args():
+    parser = ArgumentParser(description="benchmark fetch_layers.main offline")
+    parser.add_argument("--regions", type=int, default=30)
+    parser.add_argument("--layers", type=int, default=2000)
+    parser.add_argument("--versions", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--max-concurrent-calls", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--region-concurrency", type=int, default=10)
+    parser.add_argument("--output-format", default="json")
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--output", default=None)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    catalog = SyntheticCatalog(
+        regions=args.regions,
+        layers_per_region=args.layers,
+        versions_per_layer=args.versions,
+    )
+    counter = ApiCallCounter()
+
+    def client_factory(*, region: str, max_pool_connections: int):
+        return FakeLambdaClient(
+            catalog=catalog,
+            region=region,
+            counter=counter,
+            latency=args.latency,
+            page_size=args.page_size,
+            max_concurrent_calls=args.max_concurrent_calls,
+        )
+
+    os.environ.update(
+        {
+            "FETCH_REGIONS": ",".join(catalog.regions),
+            "FETCH_CONCURRENCY": str(args.concurrency),
+            "FETCH_REGION_CONCURRENCY": str(args.region_concurrency),
+            "FETCH_OUTPUT_FORMAT": args.output_format,
+        }
+    )
+
+    cwd = os.getcwd()
+    with TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        if args.tracemalloc:
+            tracemalloc.start()
+        started_at = time.perf_counter()
+        cpu_started_at = time.process_time()
+        try:
+            fetch_layers.main(client_factory=client_factory)
+        finally:
+            os.chdir(cwd)
+        wall = time.perf_counter() - started_at
+        cpu = time.process_time() - cpu_started_at
+        traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+
+    result = {
+        "benchmark": "fetch_layers",
+        "params": vars(args),
+        "wall_seconds": round(wall, 3),
+        "cpu_seconds": round(cpu, 3),
+        "api_calls": dict(counter.calls),
+        "api_calls_total": sum(counter.calls.values()),
+        "throttles": counter.throttles,
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "traced_peak_bytes": traced_peak,
+    }
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+
+import layer_publisher.generate.complete_generate as complete_generate
+from benchmarks.synthetic import SyntheticCatalog
+from layer_publisher.utils.layer_records import iter_layer_records
+
+
+def parse_args():
+    parser = ArgumentParser(
+        description="peak memory of loading one layers.json, streamed or not"
+    )
+    parser.add_argument("--layers", type=int, default=1000)
+    parser.add_argument("--versions", type=int, default=30)
+    parser.add_argument("--output", default=None)
+    return parser.parse_args()
+
+
+def measure(*, path: str, streaming: bool) -> dict:
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    aggregator = complete_generate.LayerAggregator()
+    count = 0
+    for region, x in iter_layer_records(path=path, streaming=streaming):
+        aggregator.add(complete_generate.convert_data(layer=x, region=region))
+        count += 1
+    wall_seconds = time.perf_counter() - started_at
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "streaming": streaming,
+        "layer_versions": count,
+        "wall_seconds": round(wall_seconds, 3),
+        "traced_peak_bytes": peak,
+    }
+
+
+def main():
+    args = parse_args()
+    catalog = SyntheticCatalog(
+        regions=1, layers_per_region=args.layers, versions_per_layer=args.versions
+    )
+
+    cwd = os.getcwd()
+    with TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            catalog.write_layers_tree(base_dir="layers", output_format="json")
+            [path] = complete_generate.list_files()
+            file_size = os.path.getsize(path)
+            runs = [measure(path=path, streaming=x) for x in [False, True]]
+        finally:
+            os.chdir(cwd)
+
+    result = {
+        "benchmark": "load_layers_memory",
+        "params": vars(args),
+        "file_size_bytes": file_size,
+        "runs": runs,
+    }
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
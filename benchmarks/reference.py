@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from layer_publisher.generate.complete_generate import FixedClassifiedLayers
+from layer_publisher.utils.models import LayerForGenerate, LayerRecord
+
+# the two pass aggregation LayerAggregator replaced, kept to measure it against
+# and as the expected result in the tests
+
+
+def classify_layers(*, all_layers: list[LayerRecord]) -> dict:
+    result = {}
+    for layer in all_layers:
+        mapping_identifier = result.get(layer.identifier, {})
+
+        mapping_hash = mapping_identifier.get(layer.hash, {})
+
+        arches = ", ".join(layer.architectures)
+        key_region_arch = f"{layer.runtime}:{arches}:{layer.region}"
+
+        mapping_hash[key_region_arch] = layer
+        mapping_identifier[layer.hash] = mapping_hash
+        result[layer.identifier] = mapping_identifier
+
+    return result
+
+
+def fix_layers_for_identifier(
+    *, identifier: str, mapping_hash: dict[str, dict[str, LayerRecord]]
+) -> FixedClassifiedLayers:
+    # identifier -> hash -> runtime:arches:region
+    array_hash = sorted(
+        [(max([x.created_at for x in v.values()]), v) for k, v in mapping_hash.items()],
+        key=lambda x: x[0],
+        reverse=True,
+    )
+
+    latest_layers: list[LayerForGenerate] = []
+    all_layers: list[LayerForGenerate] = []
+    for i, (_, mapping) in enumerate(array_hash):
+        node = [
+            x.to_model() for x in sorted(mapping.values(), key=lambda x: x.sort_key)
+        ]
+        if i == 0:
+            latest_layers += node
+        all_layers += node
+    return FixedClassifiedLayers(
+        identifier=identifier, latest_layers=latest_layers, all_layers=all_layers
+    )
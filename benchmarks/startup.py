@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+from layer_publisher.__main__ import COMMANDS
+
+
+def parse_args():
+    parser = ArgumentParser(description="cold start of python -m layer_publisher")
+    parser.add_argument(
+        "--commands", default=None, help="comma separated, all if unset"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--output", default=None)
+    return parser.parse_args()
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+
+
+def measure_wall(*args: str, repeat: int) -> float:
+    runs = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        run_python(*args)
+        runs.append(time.perf_counter() - started_at)
+    return statistics.median(runs)
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    # "import time:  self [us] | cumulative | imported package"
+    result = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        result[name.strip()] = (int(self_us), int(cumulative_us))
+    return result
+
+
+def measure_command(*, module_name: str, repeat: int, top: int) -> dict:
+    # the cumulative import of the command module is what dispatching adds
+    proc = run_python("-X", "importtime", "-c", f"import {module_name}")
+    imports = parse_importtime(proc.stderr)
+    heaviest = sorted(
+        ((name, x[1]) for name, x in imports.items() if "." not in name),
+        key=lambda x: x[1],
+        reverse=True,
+    )[:top]
+    return {
+        "module": module_name,
+        "import_cumulative_us": imports[module_name][1],
+        "heaviest_top_level_us": dict(heaviest),
+        "import_wall_seconds": round(
+            measure_wall("-c", f"import {module_name}", repeat=repeat), 4
+        ),
+    }
+
+
+def main():
+    args = parse_args()
+    names = args.commands.split(",") if args.commands else list(COMMANDS)
+
+    # the dispatcher alone, no command module is imported for --help
+    dispatch = run_python("-X", "importtime", "-m", "layer_publisher", "--help")
+    dispatch_imports = parse_importtime(dispatch.stderr)
+    result = {
+        "benchmark": "startup",
+        "python": sys.version.split()[0],
+        "params": vars(args),
+        "interpreter_wall_seconds": round(
+            measure_wall("-c", "pass", repeat=args.repeat), 4
+        ),
+        "dispatch_wall_seconds": round(
+            measure_wall("-m", "layer_publisher", "--help", repeat=args.repeat), 4
+        ),
+        "dispatch_imports_boto3": "boto3" in dispatch_imports,
+        "commands": {},
+    }
+    for name in names:
+        module_name, _ = COMMANDS[name]
+        result["commands"][name] = measure_command(
+            module_name=module_name, repeat=args.repeat, top=args.top
+        )
+        print(
+            f"{name:<18} {result['commands'][name]['import_cumulative_us'] / 1000:8.1f} ms",
+            flush=True,
+        )
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+from argparse import ArgumentParser
+from itertools import chain
+from tempfile import TemporaryDirectory
+from timeit import Timer
+from typing import Callable, Iterator
+
+import layer_publisher.generate.complete_generate as complete_generate
+import layer_publisher.publish.build as build
+import layer_publisher.publish.publish.before_publish as before_publish
+from benchmarks.reference import classify_layers, fix_layers_for_identifier
+from benchmarks.synthetic import SyntheticCatalog, write_publish_fixtures
+from layer_publisher.utils.layer_records import iter_layer_records
+from layer_publisher.utils.models import BuildConfig, Layer
+
+# (regions, layers per region, versions per layer) for the generate cases,
+# (packages, runtimes) for the publish cases
+SIZES = {
+    "small": {"catalog": (2, 50, 5), "publish": (5, 5)},
+    "medium": {"catalog": (10, 100, 10), "publish": (50, 20)},
+    "large": {"catalog": (30, 100, 10), "publish": (500, 100)},
+}
+
+
+def parse_args():
+    parser = ArgumentParser(
+        description="benchmark the pure generate / publish functions"
+    )
+    parser.add_argument("--sizes", default="small,medium,large")
+    parser.add_argument("--cases", default=None, help="comma separated, all if unset")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None)
+    parser.add_argument(
+        "--compare", default=None, help="results of an earlier run to diff against"
+    )
+    return parser.parse_args()
+
+
+def measure(fn: Callable[[], object], *, repeat: int) -> tuple[list[float], int]:
+    # seconds per call; fast functions are looped until a run takes 0.2 s
+    timer = Timer(fn)
+    number, _ = timer.autorange()
+    return [x / number for x in timer.repeat(repeat=repeat, number=number)], number
+
+
+def iter_generate_cases(*, size: str) -> Iterator[tuple[str, dict, Callable]]:
+    regions, layers, versions = SIZES[size]["catalog"]
+    params = {"regions": regions, "layers": layers, "versions": versions}
+    SyntheticCatalog(
+        regions=regions, layers_per_region=layers, versions_per_layer=versions
+    ).write_layers_tree(base_dir="layers")
+    all_files = complete_generate.list_files()
+
+    all_layers, _ = complete_generate.aggregate_files(all_files=all_files)
+    classified = classify_layers(all_layers=all_layers)
+    models = [x.to_model() for x in all_layers]
+    _, aggregator = complete_generate.load_and_aggregate(all_files=all_files)
+    source_data = aggregator.to_source_data()
+
+    yield (
+        "load_layers",
+        params,
+        lambda: list(
+            complete_generate.iter_records(
+                records=chain.from_iterable(
+                    iter_layer_records(path=x) for x in all_files
+                )
+            )
+        ),
+    )
+    yield (
+        "classify_layers",
+        params,
+        lambda: classify_layers(all_layers=all_layers),
+    )
+    yield (
+        "fix_layers_for_identifier",
+        params,
+        lambda: [
+            fix_layers_for_identifier(identifier=k, mapping_hash=v)
+            for k, v in classified.items()
+        ],
+    )
+
+    def aggregate():
+        _, aggregator = complete_generate.load_and_aggregate(all_files=all_files)
+        return aggregator.to_source_data()
+
+    yield ("load_and_aggregate", params, aggregate)
+    yield ("sort_key", params, lambda: sorted(models, key=lambda x: x.sort_key))
+    yield (
+        "build_source_index",
+        params,
+        lambda: complete_generate.build_source_index(source_data=source_data),
+    )
+
+
+def iter_publish_cases(*, size: str) -> Iterator[tuple[str, dict, Callable]]:
+    packages, runtimes = SIZES[size]["publish"]
+    params = {"packages": packages, "runtimes": runtimes}
+    write_publish_fixtures(base_dir=".", index=0, packages=packages, runtimes=runtimes)
+    layer = Layer.load()
+    config = BuildConfig.load()
+
+    target = before_publish.calc_template_target(
+        layer=layer, all_runtimes=config.runtimes
+    )
+    desc_data = target.desc_data
+    env = build.EnvironmentVariables(
+        my_runner_name="runner-amd", max_concurrency=4, concurrency_index=0
+    )
+    base_lines = build.generate_lines(layer=layer, all_runtimes=config.runtimes)
+
+    yield (
+        "generate_template",
+        params,
+        lambda: before_publish.generate_template(targets=[target]),
+    )
+    # the same layer under many identifiers, as a batch would publish it. one
+    # package each, the large package list alone does not fit a template
+    targets = [
+        target.model_copy(
+            update={
+                "desc_data": desc_data.model_copy(
+                    update={
+                        "identifier": f"{desc_data.identifier}-{i}",
+                        "packages": layer.packages[0],
+                    }
+                )
+            }
+        )
+        for i in range(50)
+    ]
+    yield (
+        "partition_templates",
+        params,
+        lambda: before_publish.partition_templates(targets=targets),
+    )
+    yield (
+        "calc_description_data",
+        params,
+        lambda: before_publish.calc_description_data(layer=layer),
+    )
+    yield (
+        "generate_lines",
+        params,
+        lambda: build.generate_lines(layer=layer, all_runtimes=config.runtimes),
+    )
+    yield (
+        "filter_lines",
+        params,
+        lambda: build.filter_lines(
+            base_lines=base_lines,
+            env=env,
+            is_architecture_split=layer.isArchitectureSplit,
+        ),
+    )
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(*, results: list[dict], path: str):
+    with open(path) as f:
+        previous = {(x["case"], x["size"]): x for x in json.load(f)["results"]}
+    for x in results:
+        before = previous.get((x["case"], x["size"]))
+        if before is None:
+            continue
+        ratio = x["best_seconds"] / before["best_seconds"]
+        print(
+            f"{x['case']:<28} {x['size']:<7} "
+            f"{before['best_seconds'] * 1000:.3f} ms -> "
+            f"{x['best_seconds'] * 1000:.3f} ms "
+            f"({ratio:.2f}x)"
+        )
+
+
+def main():
+    args = parse_args()
+    cases = set(args.cases.split(",")) if args.cases else None
+
+    cwd = os.getcwd()
+    results = []
+    for size in args.sizes.split(","):
+        with TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                for iter_cases in [iter_generate_cases, iter_publish_cases]:
+                    for name, params, fn in iter_cases(size=size):
+                        if cases is not None and name not in cases:
+                            continue
+                        runs, number = measure(fn, repeat=args.repeat)
+                        results.append(
+                            {
+                                "case": name,
+                                "size": size,
+                                "params": params,
+                                "best_seconds": round(min(runs), 9),
+                                "median_seconds": round(statistics.median(runs), 9),
+                                "repeat": args.repeat,
+                                "number": number,
+                            }
+                        )
+                        print(
+                            f"{name:<28} {size:<7} {min(runs) * 1000:.3f} ms",
+                            flush=True,
+                        )
+            finally:
+                os.chdir(cwd)
+
+    result = {
+        "benchmark": "suite",
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "params": vars(args),
+        "results": results,
+    }
+    if args.compare:
+        compare(results=results, path=args.compare)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from hashlib import sha3_224
+from os import makedirs
+from typing import Iterator
+
+from humps import pascalize
+
+from layer_publisher.utils.layer_records import (
+    FORMAT_JSON,
+    FORMAT_NDJSON,
+    generate_file_name,
+    write_layer_records,
+)
+from layer_publisher.utils.serialization import dumps
+from layer_publisher.utils.variables import FILE_BUILD_CONFIG, FILE_LAYER_INFO, REGIONS
+
+RUNTIMES = ["python3.14", "python3.13", "python3.12", "python3.11", "python3.10"]
+# (logical name suffix, CompatibleArchitectures)
+ARCHITECTURES = [("Amd", ["x86_64"]), ("Arm", ["arm64"])]
+ACCOUNT_ID = "123456789012"
+BASE_DATE = datetime(2025, 5, 1, tzinfo=timezone.utc)
+
+
+class SyntheticCatalog:
+    # deterministic stand-in for the layers published by this project.
+    # versions are generated on demand, so 30 regions x 2,000 layers x 50
+    # versions never has to be held in memory
+    def __init__(
+        self, *, regions: int, layers_per_region: int, versions_per_layer: int
+    ):
+        self.regions = REGIONS[:regions]
+        self.layers_per_region = layers_per_region
+        self.versions_per_layer = versions_per_layer
+        self.variants = [(r, a) for r in RUNTIMES for a in ARCHITECTURES]
+        self.layer_names = [self._layer_name(index=i) for i in range(layers_per_region)]
+        self.layer_indexes = {x: i for i, x in enumerate(self.layer_names)}
+
+    def _split(self, *, index: int) -> tuple[str, str, tuple[str, list[str]]]:
+        identifier = f"package-{index // len(self.variants):05d}"
+        runtime, arch = self.variants[index % len(self.variants)]
+        return identifier, runtime, arch
+
+    def _layer_name(self, *, index: int) -> str:
+        identifier, runtime, (suffix, _) = self._split(index=index)
+        return "LuciferousPublicLayer{identifier}{runtime}{suffix}".format(
+            identifier=pascalize(identifier),
+            runtime=pascalize(runtime).replace(".", ""),
+            suffix=suffix,
+        )
+
+    def generate_layer(self, *, region: str, index: int) -> dict:
+        return {
+            "LayerName": self.layer_names[index],
+            "LayerArn": self._layer_arn(region=region, index=index),
+            "LatestMatchingVersion": self.generate_version(
+                region=region, index=index, version=self.versions_per_layer
+            ),
+        }
+
+    def _layer_arn(self, *, region: str, index: int) -> str:
+        return f"arn:aws:lambda:{region}:{ACCOUNT_ID}:layer:{self.layer_names[index]}"
+
+    def generate_version(self, *, region: str, index: int, version: int) -> dict:
+        identifier, runtime, (_, architectures) = self._split(index=index)
+        # one publish shares its description across runtimes, archs and regions
+        digest = sha3_224(f"{identifier}:{version}".encode()).hexdigest()
+        created_at = BASE_DATE + timedelta(
+            days=version, minutes=index // len(self.variants)
+        )
+        return {
+            "LayerVersionArn": f"{self._layer_arn(region=region, index=index)}:{version}",
+            "Version": version,
+            "Description": (
+                f"identifier=== {identifier}\n"
+                f"hash=== {digest}\n"
+                f"packages=== {identifier}=={version}.0.0\n"
+            ),
+            "CreatedDate": created_at.strftime("%Y-%m-%dT%H:%M:%S.000+0000"),
+            "CompatibleRuntimes": [runtime],
+            "LicenseInfo": "MIT",
+            "CompatibleArchitectures": architectures,
+        }
+
+    def iter_versions(self, *, region: str, index: int) -> Iterator[dict]:
+        # newest first, like list_layer_versions
+        for version in range(self.versions_per_layer, 0, -1):
+            yield self.generate_version(region=region, index=index, version=version)
+
+    def iter_region(self, *, region: str) -> Iterator[dict]:
+        for index in range(self.layers_per_region):
+            yield from self.iter_versions(region=region, index=index)
+
+    def write_layers_tree(self, *, base_dir: str, output_format: str = FORMAT_JSON):
+        # the layers/<region>/layers.json tree complete_generate reads
+        for region in self.regions:
+            dirname = f"{base_dir}/{region}"
+            makedirs(dirname, exist_ok=True)
+            path = f"{dirname}/{generate_file_name(output_format=output_format)}"
+            with open(path, "wb") as f:
+                if output_format == FORMAT_NDJSON:
+                    write_layer_records(
+                        f=f, region=region, records=self.iter_region(region=region)
+                    )
+                else:
+                    f.write(
+                        dumps(
+                            {
+                                "region": region,
+                                "layers": list(self.iter_region(region=region)),
+                            }
+                        )
+                    )
+
+
+def generate_runtimes(*, count: int) -> list[str]:
+    # the real runtimes first, then made up newer ones for larger templates
+    return [*RUNTIMES, *(f"python3.{15 + i}" for i in range(count))][:count]
+
+
+def generate_layer_info(
+    *, index: int, packages: int, is_architecture_split: bool = True
+) -> dict:
+    # layer.json as start_publish saves it from the layers table
+    identifier = f"package-{index:05d}"
+    return {
+        "identifier": identifier,
+        "packages": [f"{identifier}-dep-{i:03d}=={i}.0.0" for i in range(packages)],
+        "ignoreVersions": [RUNTIMES[-1]],
+        "isArchitectureSplit": is_architecture_split,
+        "note": f"synthetic layer {index}",
+    }
+
+
+def write_publish_fixtures(*, base_dir: str, index: int, packages: int, runtimes: int):
+    # layer.json and build_config.json the publish steps read
+    makedirs(base_dir, exist_ok=True)
+    with open(f"{base_dir}/{FILE_LAYER_INFO}", "wb") as f:
+        f.write(dumps(generate_layer_info(index=index, packages=packages), indent=True))
+    with open(f"{base_dir}/{FILE_BUILD_CONFIG}", "wb") as f:
+        f.write(dumps({"runtimes": generate_runtimes(count=runtimes)}, indent=True))
@@ -4,11 +4,12 @@ set -xeuo pipefail
 
 usage() {
   cat <<'EOT'
-build.sh --arch <amd|arm> --runtime <Python Runtime> --packages <PyPI Modules>
+build.sh --arch <amd|arm> --runtime <Python Runtime> --packages <PyPI Modules> [--identifier <Identifier>]
 
   --arch CPU architecture. "amd" or "arm"
   --runtime Lambda Python Runtime
   --packages PyPI Modules
+  --identifier Install into modules/<Identifier>/ for a batch stack
 EOT
 }
 
@@ -16,6 +17,7 @@ EOT
 ARG_ARCH=""
 ARG_RUNTIME=""
 ARG_PACKAGES=()
+ARG_IDENTIFIER=""
 
 # 引数の解析
 while [[ $# -gt 0 ]]; do
@@ -29,6 +31,10 @@ while [[ $# -gt 0 ]]; do
             ARG_RUNTIME="$2"
             shift 2
             ;;
+        --identifier)
+            ARG_IDENTIFIER="$2"
+            shift 2
+            ;;
         --packages)
             shift
             # --packages の後ろに続く全ての値をARG_PACKAGES配列に格納
@@ -49,10 +55,12 @@ done
 arch=$ARG_ARCH
 runtime=$ARG_RUNTIME
 packages="${ARG_PACKAGES[*]}"
+identifier=$ARG_IDENTIFIER
 
 echo "arch=:$arch:"
 echo "runtime=:$runtime:"
 echo "packages=:$packages:"
+echo "identifier=:$identifier:"
 
 if [[ -z "$arch" || -z "$runtime" || -z "$packages" ]]; then
   usage
@@ -63,13 +71,18 @@ container_image="public.ecr.aws/sam/build-${runtime}:latest"
 container_name="build"
 
 # modules/<{amd, arm}>/<{python3.13, python3.12}>/python
+# modules/<identifier>/<{amd, arm}>/<{python3.13, python3.12}>/python in a batch
+modules_dir="modules"
+if [[ -n "$identifier" ]]; then
+  modules_dir="modules/${identifier}"
+fi
 
 docker container run \
   --name $container_name \
   "$container_image" \
   pip install \
   $packages \
-  -t "/tmp/dist/modules/${arch}/${runtime}/python"
+  -t "/tmp/dist/${modules_dir}/${arch}/${runtime}/python"
 
 docker container cp "${container_name}:/tmp/dist" .
 docker container rm "${container_name}"
\ No newline at end of file
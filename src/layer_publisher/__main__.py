@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import sys
+from argparse import ArgumentParser
+from importlib import import_module
+
+# command -> (module, help). modules are imported only once their command is
+# dispatched, so `--help` or one stage never pays for boto3 of another
+COMMANDS = {
+    "start-publish": (
+        "layer_publisher.publish.start_publish",
+        "mark the layer as deploying and save layer.json",
+    ),
+    "build": ("layer_publisher.publish.build", "write install_script.sh"),
+    "before-publish": (
+        "layer_publisher.publish.publish.before_publish",
+        "create the bucket and write sam.yml / deploy.sh",
+    ),
+    "after-publish": (
+        "layer_publisher.publish.publish.after_publish",
+        "delete the deploy bucket",
+    ),
+    "finish-publish": (
+        "layer_publisher.publish.finish_publish",
+        "mark the layer as published",
+    ),
+    "start-generate": (
+        "layer_publisher.generate.start_generate",
+        "mark generating as deploying and save layer.json",
+    ),
+    "fetch-layers": (
+        "layer_publisher.generate.fetch_layers",
+        "write dist/layers/<region>/layers.json",
+    ),
+    "complete-generate": (
+        "layer_publisher.generate.complete_generate",
+        "aggregate the layers and write source_data.json",
+    ),
+    "generate-pipeline": (
+        "layer_publisher.generate.pipeline",
+        "start-generate, fetch-layers and complete-generate in one process",
+    ),
+    "set-failed-state": (
+        "layer_publisher.set_failed_state",
+        "mark the run as failed and notify",
+    ),
+}
+
+
+def create_parser() -> ArgumentParser:
+    parser = ArgumentParser(prog="python -m layer_publisher")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, text) in COMMANDS.items():
+        subparsers.add_parser(name, help=text, description=text)
+    return parser
+
+
+def main(argv: list[str] | None = None):
+    args = create_parser().parse_args(argv)
+    module_name, _ = COMMANDS[args.command]
+    import_module(module_name).main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,37 +1,70 @@
 from __future__ import annotations
 
 import json
+import os
+import re
+import shutil
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from glob import glob
-from typing import TYPE_CHECKING
+from hashlib import sha256 as calc_sha256
+from itertools import chain, repeat
+from os import makedirs, remove, replace
+from os.path import basename, exists, getsize
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Mapping
+from urllib.parse import quote
 from zoneinfo import ZoneInfo
 
-import boto3
+from humps import pascalize
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 
-from layer_publisher.utils.models import LayerForGenerate
-from layer_publisher.utils.variables import FILE_SOURCE_DATA
+from layer_publisher.utils.artifacts import SUFFIXES, read_sidecar, write_artifact
+from layer_publisher.utils.aws import get_client, get_resource
+from layer_publisher.utils.layer_records import iter_layer_records
+from layer_publisher.utils.models import LayerForGenerate, LayerRecord
+from layer_publisher.utils.profiler import profile_main, span
+from layer_publisher.utils.serialization import dumps, load_file, loads
+from layer_publisher.utils.variables import (
+    DIR_SHARDS,
+    DIR_SOURCE_DATA_DELTAS,
+    DIR_SOURCE_DATA_SHARDS,
+    DIR_SOURCE_DATA_UPLOAD,
+    FILE_SOURCE_DATA,
+    FILE_SOURCE_DATA_DELTA,
+    FILE_SOURCE_DATA_MANIFEST,
+    FILE_SOURCE_DATA_REMOVED,
+    FILE_SOURCE_INDEX,
+)
 
 if TYPE_CHECKING:
+    from functools import _CacheInfo
+
     from mypy_boto3_dynamodb.service_resource import Table
+    from mypy_boto3_s3 import S3Client
 
 
 class EnvironmentVariables(BaseSettings):
     table_name: str
     identifier: str
     bucket_name_layers_data: str
+    # "all" rebuilds every identifier, "identifier" only env.identifier
+    generate_scope: str = "all"
+    # local directory standing in for the layers data bucket
+    layers_data_dir: str | None = None
+    # processes parsing the region files, unset for one per CPU
+    generate_workers: int | None = None
+    # also write the catalog as a SQLite database to this path
+    generate_sqlite_path: str | None = None
 
 
 class AllLayers(BaseModel):
     all_layers: list[LayerForGenerate]
 
 
-class TmpMapping(BaseModel):
-    created_at: str
-    mapping: dict[str, LayerForGenerate]
-
-
 class FixedClassifiedLayers(BaseModel):
     identifier: str
     latest_layers: list[LayerForGenerate]
@@ -42,122 +75,924 @@ class SourceData(BaseModel):
     layers: list[FixedClassifiedLayers]
 
 
+class PreviousSourceData(BaseModel):
+    source_data: SourceData
+    # of the bytes loaded, the base the next delta is diffed against
+    sha256: str
+
+
+class ShardEntry(BaseModel):
+    file: str
+    sha256: str
+    latest_hash: str | None
+    latest_layers: int
+    all_layers: int
+
+
+class SourceDataManifest(BaseModel):
+    # identifier -> shard, in the order of SourceData.layers. files are
+    # relative to the manifest
+    identifiers: dict[str, ShardEntry]
+
+
+class SourceIndex(BaseModel):
+    # every number is a position in identifiers or layers
+    identifiers: list[str]
+    # layer_version_arn
+    layers: list[str]
+    # normalized package name -> identifiers
+    packages: dict[str, list[int]]
+    # runtime -> identifiers
+    runtimes: dict[str, list[int]]
+    # "<region>|<runtime>|<architectures>" -> [identifier, layer] of the
+    # newest hash which has the combination, for every identifier
+    latest: dict[str, list[tuple[int, int]]]
+
+
+class IdentifierDelta(BaseModel):
+    identifier: str
+    # layer_version_arn
+    added: list[str]
+    removed: list[str]
+    # the new latest_layers, None when they did not change
+    latest_layers: list[LayerForGenerate] | None
+
+
+class SourceDataDelta(BaseModel):
+    # +1 for every run which changed source_data.json
+    sequence: int
+    # source_data.json the delta applies to, None when it is unknown
+    base_sha256: str | None
+    # source_data.json after applying the delta
+    sha256: str
+    # changed identifiers only, removed ones have no latest_layers left
+    identifiers: list[IdentifierDelta]
+
+
 jst = ZoneInfo("Asia/Tokyo")
-env = EnvironmentVariables()
 
-table: Table = boto3.resource("dynamodb").Table(env.table_name)
+DESCRIPTION_CACHE_SIZE = 4096
+
+# "pandas[excel]>=2.0" -> "pandas"
+_package_name_end = re.compile(r"[\[<>=!~;@ ]")
 
 
+@profile_main("complete_generate")
 def main():
-    aggregate_layers()
-    update_state()
+    run(env=EnvironmentVariables())
+
+
+def run(
+    *,
+    env: EnvironmentVariables,
+    records: Iterable[tuple[str, dict]] | None = None,
+) -> SourceData:
+    # records are (region, layer version) handed over in memory, in the order
+    # of the region files; without them the files from list_files() are read
+    with span("load_previous_source_data"):
+        previous = load_previous_source_data(
+            layers_data_dir=env.layers_data_dir,
+            bucket_name=env.bucket_name_layers_data,
+        )
+    if env.generate_scope == "identifier":
+        source_data = aggregate_layers_for_identifier(
+            env=env,
+            previous=previous.source_data if previous else None,
+            records=records,
+        )
+    else:
+        source_data = aggregate_layers(
+            workers=env.generate_workers,
+            sqlite_path=env.generate_sqlite_path,
+            records=records,
+        )
+    with span("save_delta"):
+        save_delta(
+            previous=previous,
+            source_data=source_data,
+            previous_delta=load_previous_delta(
+                layers_data_dir=env.layers_data_dir,
+                bucket_name=env.bucket_name_layers_data,
+            ),
+        )
+    with span("save_shard_upload"):
+        save_shard_upload(
+            previous=load_previous_manifest(
+                layers_data_dir=env.layers_data_dir,
+                bucket_name=env.bucket_name_layers_data,
+            ),
+            manifest=SourceDataManifest(
+                **load_file(f"{DIR_SOURCE_DATA_SHARDS}/{FILE_SOURCE_DATA_MANIFEST}")
+            ),
+            dirname=DIR_SOURCE_DATA_SHARDS,
+            upload_dirname=DIR_SOURCE_DATA_UPLOAD,
+        )
+    with span("update_state"):
+        update_state(env=env)
+    return source_data
 
 
 def list_files() -> list[str]:
-    return sorted(glob("layers/**/*.json", recursive=True))
+    return sorted(
+        glob("layers/**/*.json", recursive=True)
+        + glob("layers/**/*.ndjson", recursive=True)
+    )
 
 
-def convert_data(*, layer: dict, region: str) -> LayerForGenerate:
-    description: str = layer["Description"]
+@lru_cache(maxsize=DESCRIPTION_CACHE_SIZE)
+def parse_description(description: str) -> Mapping[str, str]:
+    # one publish writes the same description to every runtime, architecture
+    # and region, so it is parsed once per publish. read only, it is shared
     data = {}
     for line in description.split("\n"):
         if not line:
             continue
         key, value = line.split("=== ")
         data[key] = value
-    return LayerForGenerate(
+    return MappingProxyType(data)
+
+
+def count_description_cache(*, before: _CacheInfo) -> dict:
+    # what parsing since `before` did to the cache of this process
+    after = parse_description.cache_info()
+    return {
+        "hits": after.hits - before.hits,
+        "misses": after.misses - before.misses,
+        "sizes": {os.getpid(): after.currsize},
+    }
+
+
+def merge_description_cache_counts(*, total: dict, counts: dict):
+    total["hits"] = total.get("hits", 0) + counts["hits"]
+    total["misses"] = total.get("misses", 0) + counts["misses"]
+    # every worker process has its own cache, the latest size of each counts
+    total.setdefault("sizes", {}).update(counts["sizes"])
+
+
+def calc_description_cache_stats(*, counts: dict) -> dict:
+    hits = counts.get("hits", 0)
+    misses = counts.get("misses", 0)
+    sizes = counts.get("sizes", {})
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "size": sum(sizes.values()),
+        "max_size": DESCRIPTION_CACHE_SIZE,
+        "processes": len(sizes),
+        "hit_rate": hits / total if total else 0.0,
+    }
+
+
+def print_description_cache_stats(*, counts: dict):
+    stats = calc_description_cache_stats(counts=counts)
+    if stats["hits"] + stats["misses"]:
+        print(f"description cache: {stats}")
+
+
+def convert_data(*, layer: dict, region: str) -> LayerRecord:
+    data = parse_description(layer["Description"])
+    return LayerRecord(
+        identifier=data["identifier"],
+        hash=data["hash"],
+        packages=data["packages"],
+        note=data.get("note"),
         runtime=layer["CompatibleRuntimes"][0],
         architectures=layer["CompatibleArchitectures"],
         layer_version_arn=layer["LayerVersionArn"],
         created_at=layer["CreatedDate"],
         region=region,
-        **data,
     )
 
 
-def load_layers(*, all_files: list[str]) -> AllLayers:
-    result: list[LayerForGenerate] = []
+def generate_layer_name_prefix(*, identifier: str) -> str:
+    return f"LuciferousPublicLayer{pascalize(identifier)}"
+
+
+def is_target_layer(*, layer: dict, layer_name_prefix: str | None) -> bool:
+    if layer_name_prefix is None:
+        return True
+    # arn:aws:lambda:<region>:<account>:layer:<name>:<version>
+    return layer["LayerVersionArn"].split(":")[6].startswith(layer_name_prefix)
+
+
+def iter_records(
+    *, records: Iterable[tuple[str, dict]], identifier: str | None = None
+) -> Iterator[LayerRecord]:
+    layer_name_prefix = (
+        generate_layer_name_prefix(identifier=identifier) if identifier else None
+    )
 
     exclude_arns = {
         "arn:aws:lambda:ap-northeast-1:043309354008:layer:dd530c3cdd49e5bdf0fbeaf774c0c63d484250ee5ae4b101647f6757bf1e180d:3"
     }
 
-    for path in all_files:
-        with open(path) as f:
-            data = json.load(f)
-        result += [
-            convert_data(layer=x, region=data["region"])
-            for x in data["layers"]
-            if x["LayerVersionArn"] not in exclude_arns
-        ]
+    for region, x in records:
+        if x["LayerVersionArn"] in exclude_arns:
+            continue
+        if not is_target_layer(layer=x, layer_name_prefix=layer_name_prefix):
+            continue
+        layer = convert_data(layer=x, region=region)
+        # the name prefix of "zstd" also matches "zstd-xxx"
+        if identifier and layer.identifier != identifier:
+            continue
+        yield layer
+
+
+class HashGroup:
+    __slots__ = ("mapping", "created_at", "is_dirty")
+
+    def __init__(self):
+        self.mapping: dict[tuple, LayerRecord] = {}
+        self.created_at = ""
+        self.is_dirty = False
+
+
+class LayerAggregator:
+    # identifier -> hash -> latest record of every runtime, architectures and
+    # region. records are grouped as they arrive and the newest created_at of
+    # every hash is kept up to date, so finishing only sorts each identifier once
+    def __init__(self):
+        # identifier -> hash -> (runtime, architectures, region)
+        self.identifiers: dict[str, dict[str, HashGroup]] = {}
+
+    def add(self, layer: LayerRecord):
+        groups = self.identifiers.get(layer.identifier)
+        if groups is None:
+            groups = self.identifiers[layer.identifier] = {}
+        group = groups.get(layer.hash)
+        if group is None:
+            group = groups[layer.hash] = HashGroup()
+
+        key = (layer.runtime, layer.architectures, layer.region)
+        replaced = group.mapping.get(key)
+        group.mapping[key] = layer
+        if replaced is not None and replaced.created_at == group.created_at:
+            # the newest one was overwritten, recompute it when finishing
+            group.is_dirty = True
+        elif layer.created_at > group.created_at:
+            group.created_at = layer.created_at
+
+    def merge(self, other: LayerAggregator):
+        # merging partials in file order gives the same result as adding
+        # every record here, only the surviving record of each key matters
+        for groups in other.identifiers.values():
+            for group in groups.values():
+                for layer in group.mapping.values():
+                    self.add(layer)
+
+    def fix(self, *, identifier: str) -> FixedClassifiedLayers:
+        groups = self.identifiers[identifier]
+        for group in groups.values():
+            if group.is_dirty:
+                group.created_at = max(x.created_at for x in group.mapping.values())
+                group.is_dirty = False
+
+        # sorted() is stable, ties keep the order the hashes arrived in
+        ranked = sorted(groups.values(), key=lambda x: x.created_at, reverse=True)
+        records = sorted(
+            (
+                (rank, layer)
+                for rank, group in enumerate(ranked)
+                for layer in group.mapping.values()
+            ),
+            key=lambda x: (x[0], x[1].sort_key),
+        )
 
-    return AllLayers(all_layers=result)
+        latest_layers: list[LayerForGenerate] = []
+        all_layers: list[LayerForGenerate] = []
+        for rank, layer in records:
+            model = layer.to_model()
+            if rank == 0:
+                latest_layers.append(model)
+            all_layers.append(model)
+        return FixedClassifiedLayers(
+            identifier=identifier, latest_layers=latest_layers, all_layers=all_layers
+        )
 
+    def to_source_data(self) -> SourceData:
+        return SourceData(layers=[self.fix(identifier=x) for x in self.identifiers])
 
-def classify_layers(*, all_layers: list[LayerForGenerate]) -> dict:
-    result = {}
-    for layer in all_layers:
-        mapping_identifier = result.get(layer.identifier, {})
 
-        mapping_hash = mapping_identifier.get(layer.hash, {})
+def aggregate_files(
+    *, all_files: list[str], identifier: str | None = None
+) -> tuple[list[LayerRecord], LayerAggregator]:
+    return aggregate_records(
+        records=chain.from_iterable(iter_layer_records(path=x) for x in all_files),
+        identifier=identifier,
+    )
 
-        arches = ", ".join(layer.architectures)
-        key_region_arch = f"{layer.runtime}:{arches}:{layer.region}"
 
-        mapping_hash[key_region_arch] = layer
-        mapping_identifier[layer.hash] = mapping_hash
-        result[layer.identifier] = mapping_identifier
+def aggregate_records(
+    *, records: Iterable[tuple[str, dict]], identifier: str | None = None
+) -> tuple[list[LayerRecord], LayerAggregator]:
+    aggregator = LayerAggregator()
+    all_layers = []
+    for layer in iter_records(records=records, identifier=identifier):
+        all_layers.append(layer)
+        aggregator.add(layer)
+    return all_layers, aggregator
+
+
+def map_layers_file(
+    path: str, identifier: str | None = None
+) -> tuple[list[LayerRecord], LayerAggregator, dict]:
+    before = parse_description.cache_info()
+    all_layers, aggregator = aggregate_files(all_files=[path], identifier=identifier)
+    return all_layers, aggregator, count_description_cache(before=before)
+
+
+def load_and_aggregate(
+    *,
+    all_files: list[str],
+    identifier: str | None = None,
+    workers: int | None = 1,
+    cache_counts: dict | None = None,
+) -> tuple[list[LayerRecord], LayerAggregator]:
+    # one file per region: parse and aggregate them in worker processes,
+    # then reduce the partials in file order. workers=1 stays in process.
+    # cache_counts gets the description cache counts of every process
+    cache_counts = {} if cache_counts is None else cache_counts
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(all_files) <= 1:
+        before = parse_description.cache_info()
+        result = aggregate_files(all_files=all_files, identifier=identifier)
+        merge_description_cache_counts(
+            total=cache_counts, counts=count_description_cache(before=before)
+        )
+        return result
+
+    all_layers = []
+    aggregator = LayerAggregator()
+    with ProcessPoolExecutor(max_workers=min(workers, len(all_files))) as executor:
+        for partial_layers, partial, counts in executor.map(
+            map_layers_file, all_files, repeat(identifier)
+        ):
+            all_layers += partial_layers
+            aggregator.merge(partial)
+            merge_description_cache_counts(total=cache_counts, counts=counts)
+    return all_layers, aggregator
+
+
+def aggregate_input(
+    *,
+    records: Iterable[tuple[str, dict]] | None,
+    identifier: str | None,
+    workers: int | None,
+    cache_counts: dict,
+) -> tuple[list[LayerRecord], LayerAggregator]:
+    # the region files, or the records handed over in memory
+    if records is None:
+        return load_and_aggregate(
+            all_files=list_files(),
+            identifier=identifier,
+            workers=workers,
+            cache_counts=cache_counts,
+        )
+    before = parse_description.cache_info()
+    result = aggregate_records(records=records, identifier=identifier)
+    merge_description_cache_counts(
+        total=cache_counts, counts=count_description_cache(before=before)
+    )
+    return result
+
 
+def aggregate_layers(
+    *,
+    workers: int | None = 1,
+    sqlite_path: str | None = None,
+    records: Iterable[tuple[str, dict]] | None = None,
+) -> SourceData:
+    cache_counts = {}
+    with span("load_and_aggregate"):
+        all_layers, aggregator = aggregate_input(
+            records=records, identifier=None, workers=workers, cache_counts=cache_counts
+        )
+    with span("fix"):
+        source_data = aggregator.to_source_data()
+    with span("save_outputs"):
+        save_outputs(
+            all_layers=all_layers, source_data=source_data, sqlite_path=sqlite_path
+        )
+    print_description_cache_stats(counts=cache_counts)
+    return source_data
+
+
+def aggregate_layers_for_identifier(
+    *,
+    env: EnvironmentVariables,
+    previous: SourceData | None = None,
+    records: Iterable[tuple[str, dict]] | None = None,
+) -> SourceData:
+    if previous is None:
+        loaded = load_previous_source_data(
+            layers_data_dir=env.layers_data_dir,
+            bucket_name=env.bucket_name_layers_data,
+        )
+        previous = loaded.source_data if loaded else None
+    if previous is None:
+        # splicing into nothing would upload a catalog of one identifier
+        raise ValueError(
+            f"the previous {FILE_SOURCE_DATA} is required to generate one identifier"
+        )
+    cache_counts = {}
+    with span("load_and_aggregate"):
+        _, aggregator = aggregate_input(
+            records=records,
+            identifier=env.identifier,
+            workers=env.generate_workers,
+            cache_counts=cache_counts,
+        )
+    with span("fix"):
+        fixed = (
+            aggregator.fix(identifier=env.identifier)
+            if env.identifier in aggregator.identifiers
+            else None
+        )
+        source_data = splice_source_data(
+            previous=previous, identifier=env.identifier, fixed=fixed
+        )
+    with span("save_outputs"):
+        # all_layers.json would only hold this identifier, it is left out
+        save_outputs(
+            all_layers=None,
+            source_data=source_data,
+            sqlite_path=env.generate_sqlite_path,
+        )
+    print_description_cache_stats(counts=cache_counts)
+    return source_data
+
+
+def load_previous_bytes(
+    *, layers_data_dir: str | None, bucket_name: str, key: str
+) -> bytes | None:
+    if layers_data_dir:
+        path = f"{layers_data_dir}/{key}"
+        if not exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    s3: S3Client = get_client("s3")
+    with span(f"s3_get_object {key}"):
+        try:
+            resp = s3.get_object(Bucket=bucket_name, Key=key)
+        except s3.exceptions.NoSuchKey:
+            return None
+        return resp["Body"].read()
+
+
+def load_previous_file(
+    *, layers_data_dir: str | None, bucket_name: str, key: str
+) -> dict | None:
+    data = load_previous_bytes(
+        layers_data_dir=layers_data_dir, bucket_name=bucket_name, key=key
+    )
+    return None if data is None else loads(data)
+
+
+def load_previous_source_data(
+    *, layers_data_dir: str | None, bucket_name: str
+) -> PreviousSourceData | None:
+    data = load_previous_bytes(
+        layers_data_dir=layers_data_dir, bucket_name=bucket_name, key=FILE_SOURCE_DATA
+    )
+    if data is None:
+        return None
+    return PreviousSourceData(
+        source_data=SourceData(**loads(data)), sha256=calc_sha256(data).hexdigest()
+    )
+
+
+def load_previous_manifest(
+    *, layers_data_dir: str | None, bucket_name: str
+) -> SourceDataManifest | None:
+    data = load_previous_file(
+        layers_data_dir=layers_data_dir,
+        bucket_name=bucket_name,
+        key=f"{DIR_SOURCE_DATA_SHARDS}/{FILE_SOURCE_DATA_MANIFEST}",
+    )
+    return None if data is None else SourceDataManifest(**data)
+
+
+def load_previous_delta(
+    *, layers_data_dir: str | None, bucket_name: str
+) -> SourceDataDelta | None:
+    data = load_previous_file(
+        layers_data_dir=layers_data_dir,
+        bucket_name=bucket_name,
+        key=FILE_SOURCE_DATA_DELTA,
+    )
+    return None if data is None else SourceDataDelta(**data)
+
+
+def splice_source_data(
+    *, previous: SourceData, identifier: str, fixed: FixedClassifiedLayers | None
+) -> SourceData:
+    # keep the position of the identifier, new ones are appended
+    result = []
+    replaced = False
+    for layer in previous.layers:
+        if layer.identifier != identifier:
+            result.append(layer)
+        elif fixed is not None:
+            result.append(fixed)
+            replaced = True
+        else:
+            replaced = True
+    if not replaced and fixed is not None:
+        result.append(fixed)
+    return SourceData(layers=result)
+
+
+def diff_identifier(
+    *,
+    identifier: str,
+    previous: FixedClassifiedLayers | None,
+    current: FixedClassifiedLayers | None,
+) -> IdentifierDelta | None:
+    previous_arns = (
+        [x.layer_version_arn for x in previous.all_layers] if previous else []
+    )
+    current_arns = [x.layer_version_arn for x in current.all_layers] if current else []
+    previous_set = set(previous_arns)
+    current_set = set(current_arns)
+    previous_latest = previous.latest_layers if previous else []
+    current_latest = current.latest_layers if current else []
+
+    delta = IdentifierDelta(
+        identifier=identifier,
+        added=[x for x in current_arns if x not in previous_set],
+        removed=[x for x in previous_arns if x not in current_set],
+        latest_layers=None if current_latest == previous_latest else current_latest,
+    )
+    if not delta.added and not delta.removed and delta.latest_layers is None:
+        return None
+    return delta
+
+
+def diff_source_data(
+    *, previous: SourceData, current: SourceData
+) -> list[IdentifierDelta]:
+    # in the order of the new source_data, then the removed identifiers
+    previous_map = {x.identifier: x for x in previous.layers}
+    current_map = {x.identifier: x for x in current.layers}
+    result = []
+    for identifier in [
+        *current_map,
+        *(x for x in previous_map if x not in current_map),
+    ]:
+        delta = diff_identifier(
+            identifier=identifier,
+            previous=previous_map.get(identifier),
+            current=current_map.get(identifier),
+        )
+        if delta is not None:
+            result.append(delta)
     return result
 
 
-def fix_layers_for_identifier(
-    *, identifier: str, mapping_hash: dict[str, dict[str, LayerForGenerate]]
-) -> FixedClassifiedLayers:
-    # identifier -> hash -> runtime:arches:region
-    array_hash = sorted(
-        [
-            TmpMapping(mapping=v, created_at=max([x.created_at for x in v.values()]))
-            for k, v in mapping_hash.items()
-        ],
-        key=lambda x: x.created_at,
-        reverse=True,
+def save_delta(
+    *,
+    previous: PreviousSourceData | None,
+    source_data: SourceData,
+    previous_delta: SourceDataDelta | None,
+) -> SourceDataDelta | None:
+    # the hash comes from the sidecar of the source_data.json just written.
+    # the base is the source_data.json the diff was computed against, which
+    # is not the end of the previous delta when an upload was left half done
+    sha256 = read_sidecar(FILE_SOURCE_DATA)
+    base_sha256 = previous.sha256 if previous else None
+    identifiers = diff_source_data(
+        previous=previous.source_data if previous else SourceData(layers=[]),
+        current=source_data,
     )
+    if not identifiers and base_sha256 == sha256:
+        print(f"{FILE_SOURCE_DATA_DELTA}: unchanged")
+        return None
+    if previous_delta and previous_delta.sha256 != base_sha256:
+        print(
+            f"{FILE_SOURCE_DATA_DELTA}: sequence {previous_delta.sequence} ends at "
+            f"{previous_delta.sha256}, {FILE_SOURCE_DATA} is {base_sha256}"
+        )
 
-    result = FixedClassifiedLayers(
-        identifier=identifier, latest_layers=[], all_layers=[]
+    delta = SourceDataDelta(
+        sequence=previous_delta.sequence + 1 if previous_delta else 1,
+        base_sha256=base_sha256,
+        sha256=sha256,
+        identifiers=identifiers,
     )
-    for i, mapping in enumerate(array_hash):
-        node = sorted(mapping.mapping.values(), key=lambda x: x.sort_key)
-        if i == 0:
-            result.latest_layers += node
-        result.all_layers += node
+    data = dumps(delta.model_dump(), indent=True, compact=True)
+    # the latest one for polling, every sequence to catch up on missed ones
+    makedirs(DIR_SOURCE_DATA_DELTAS, exist_ok=True)
+    write_artifact(f"{DIR_SOURCE_DATA_DELTAS}/{delta.sequence}.json", data)
+    artifact = write_artifact(FILE_SOURCE_DATA_DELTA, data)
+    print(
+        f"{FILE_SOURCE_DATA_DELTA}: sequence {delta.sequence}, "
+        f"{len(identifiers)} identifiers, {artifact.size} bytes"
+    )
+    return delta
+
+
+def save_outputs(
+    *,
+    all_layers: list[LayerRecord] | None,
+    source_data: SourceData,
+    sqlite_path: str | None = None,
+):
+    # all_layers.json is written straight from the records, the dicts are
+    # the same as AllLayers.model_dump(). None skips it and single_layer.json
+    outputs: list[tuple[str, Callable[[], bytes]]] = []
+    if all_layers is not None:
+        outputs.append(
+            (
+                "all_layers.json",
+                lambda: dumps(
+                    {"all_layers": [x.to_dict() for x in all_layers]},
+                    indent=True,
+                    compact=True,
+                ),
+            )
+        )
+    if all_layers:
+        outputs.append(
+            (
+                "single_layer.json",
+                lambda: dumps(all_layers[0].to_dict(), indent=True),
+            )
+        )
+    outputs += [
+        (
+            FILE_SOURCE_DATA,
+            lambda: dumps(source_data.model_dump(), indent=True, compact=True),
+        ),
+        (
+            FILE_SOURCE_INDEX,
+            lambda: dumps(
+                build_source_index(source_data=source_data).model_dump(),
+                indent=True,
+                compact=True,
+            ),
+        ),
+    ]
+
+    artifacts = []
+    for path, generate in outputs:
+        with span(f"dump {path}"):
+            data = generate()
+        with span(f"write {path}"):
+            artifacts.append(write_artifact(path, data))
+    with span("save_shards"):
+        save_shards(source_data=source_data, dirname=DIR_SOURCE_DATA_SHARDS)
+    if sqlite_path:
+        with span("save_sqlite"):
+            save_sqlite(source_data=source_data, path=sqlite_path)
+        print(f"{sqlite_path}: {getsize(sqlite_path)} bytes")
+    for artifact in artifacts:
+        print(
+            "{path}: {size} bytes, sha256 {sha256}{changed}, {variants}".format(
+                path=artifact.path,
+                size=artifact.size,
+                sha256=artifact.sha256,
+                changed="" if artifact.changed else " (unchanged)",
+                variants=", ".join(
+                    f"{k} {v} bytes" for k, v in artifact.variants.items()
+                ),
+            )
+        )
+
+
+def parse_package_names(*, packages: str) -> list[str]:
+    # packages is written by before_publish as ", ".join(layer.packages),
+    # names are normalized like PyPI does (PEP 503)
+    result = []
+    for package in packages.split(","):
+        name = _package_name_end.split(package.strip(), maxsplit=1)[0]
+        if name:
+            result.append(re.sub(r"[-_.]+", "-", name).lower())
     return result
 
 
-def aggregate_layers():
-    all_files = list_files()
-    all_layers = load_layers(all_files=all_files)
-    mapping_layers = classify_layers(all_layers=all_layers.all_layers)
-    source_data = SourceData(
-        layers=[
-            fix_layers_for_identifier(identifier=k, mapping_hash=v)
-            for k, v in mapping_layers.items()
-        ]
+def generate_facet_key(*, layer: LayerForGenerate) -> str:
+    return f"{layer.region}|{layer.runtime}|{','.join(sorted(layer.architectures))}"
+
+
+def build_source_index(*, source_data: SourceData) -> SourceIndex:
+    identifiers: list[str] = []
+    layers: list[str] = []
+    packages: dict[str, list[int]] = {}
+    runtimes: dict[str, list[int]] = {}
+    latest: dict[str, list[tuple[int, int]]] = {}
+
+    for identifier_ref, fixed in enumerate(source_data.layers):
+        identifiers.append(fixed.identifier)
+        seen_packages = set()
+        seen_runtimes = set()
+        seen_keys = set()
+        # all_layers starts with the newest hash, the first one of a key wins
+        for layer in fixed.all_layers:
+            if layer.packages not in seen_packages:
+                seen_packages.add(layer.packages)
+                for name in parse_package_names(packages=layer.packages):
+                    refs = packages.setdefault(name, [])
+                    if not refs or refs[-1] != identifier_ref:
+                        refs.append(identifier_ref)
+            if layer.runtime not in seen_runtimes:
+                seen_runtimes.add(layer.runtime)
+                runtimes.setdefault(layer.runtime, []).append(identifier_ref)
+            key = generate_facet_key(layer=layer)
+            if key not in seen_keys:
+                seen_keys.add(key)
+                latest.setdefault(key, []).append((identifier_ref, len(layers)))
+                layers.append(layer.layer_version_arn)
+
+    return SourceIndex(
+        identifiers=identifiers,
+        layers=layers,
+        packages=dict(sorted(packages.items())),
+        runtimes=dict(sorted(runtimes.items())),
+        latest=dict(sorted(latest.items())),
     )
 
-    with open("all_layers.json", "w") as f:
-        json.dump(all_layers.model_dump(), f, indent=2, ensure_ascii=False)
-    with open("single_layer.json", "w") as f:
-        json.dump(
-            all_layers.all_layers[0].model_dump(), f, indent=2, ensure_ascii=False
+
+def generate_shard_file_name(*, identifier: str) -> str:
+    # own directory, so no identifier can replace the manifest. escaped
+    # like a URL path segment, every identifier gets a distinct file
+    return f"{DIR_SHARDS}/{quote(identifier, safe='')}.json"
+
+
+def save_shards(*, source_data: SourceData, dirname: str) -> SourceDataManifest:
+    # one file per identifier, so consumers fetch only what they show and
+    # only shards whose sha256 changed have to be uploaded
+    makedirs(f"{dirname}/{DIR_SHARDS}", exist_ok=True)
+    identifiers = {}
+    for layer in source_data.layers:
+        file_name = generate_shard_file_name(identifier=layer.identifier)
+        artifact = write_artifact(
+            f"{dirname}/{file_name}",
+            dumps(layer.model_dump(), indent=True, compact=True),
+        )
+        identifiers[layer.identifier] = ShardEntry(
+            file=file_name,
+            sha256=artifact.sha256,
+            latest_hash=layer.latest_layers[0].hash if layer.latest_layers else None,
+            latest_layers=len(layer.latest_layers),
+            all_layers=len(layer.all_layers),
         )
 
-    with open(FILE_SOURCE_DATA, "w") as f:
-        json.dump(source_data.model_dump(), f, indent=2, ensure_ascii=False)
+    manifest = SourceDataManifest(identifiers=identifiers)
+    write_artifact(
+        f"{dirname}/{FILE_SOURCE_DATA_MANIFEST}",
+        dumps(manifest.model_dump(), indent=True, compact=True),
+    )
+
+    # shards of identifiers which are gone, with their variants
+    files = {basename(x.file) for x in identifiers.values()}
+    for path in glob(f"{dirname}/{DIR_SHARDS}/*"):
+        name = basename(path)
+        for suffix in SUFFIXES:
+            name = name.removesuffix(suffix)
+        if name not in files:
+            remove(path)
+    return manifest
+
+
+def plan_shard_upload(
+    *, previous: SourceDataManifest | None, manifest: SourceDataManifest
+) -> tuple[list[str], list[str]]:
+    # (files to upload, files to delete) by the sha256 in the uploaded
+    # manifest. a fresh runner rewrites every shard, mtimes tell nothing
+    previous_files = (
+        {x.file: x.sha256 for x in previous.identifiers.values()} if previous else {}
+    )
+    current_files = {x.file: x.sha256 for x in manifest.identifiers.values()}
+    upload = [k for k, v in current_files.items() if previous_files.get(k) != v]
+    removed = [k for k in previous_files if k not in current_files]
+    return upload, removed
+
+
+def save_shard_upload(
+    *,
+    previous: SourceDataManifest | None,
+    manifest: SourceDataManifest,
+    dirname: str,
+    upload_dirname: str,
+):
+    # the changed shards and the manifest are copied to upload_dirname with
+    # their variants, the workflow uploads the shards before the manifest
+    upload, removed = plan_shard_upload(previous=previous, manifest=manifest)
+    if exists(upload_dirname):
+        shutil.rmtree(upload_dirname)
+    for file in [*upload, FILE_SOURCE_DATA_MANIFEST]:
+        makedirs(os.path.dirname(f"{upload_dirname}/{file}"), exist_ok=True)
+        for suffix in ["", *SUFFIXES]:
+            if exists(f"{dirname}/{file}{suffix}"):
+                shutil.copyfile(
+                    f"{dirname}/{file}{suffix}", f"{upload_dirname}/{file}{suffix}"
+                )
+    with open(FILE_SOURCE_DATA_REMOVED, "w") as f:
+        f.writelines(f"{x}{suffix}\n" for x in removed for suffix in ["", *SUFFIXES])
+    print(
+        f"{dirname}: {len(upload)} of {len(manifest.identifiers)} shards changed, "
+        f"{len(removed)} removed"
+    )
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE identifiers (
+    position INTEGER PRIMARY KEY,
+    identifier TEXT NOT NULL UNIQUE,
+    latest_hash TEXT
+);
+CREATE TABLE layers (
+    identifier TEXT NOT NULL,
+    -- position in FixedClassifiedLayers.all_layers
+    position INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    -- 0 for the newest hash, the rows of latest_layers
+    hash_rank INTEGER NOT NULL,
+    packages TEXT NOT NULL,
+    note TEXT,
+    runtime TEXT NOT NULL,
+    -- comma separated, in the original order
+    architectures TEXT NOT NULL,
+    layer_version_arn TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    region TEXT NOT NULL,
+    PRIMARY KEY (identifier, position)
+) WITHOUT ROWID;
+"""
+
+SQLITE_INDEXES = """
+CREATE INDEX layers_hash ON layers (hash);
+CREATE INDEX layers_region ON layers (region, runtime);
+CREATE INDEX layers_runtime ON layers (runtime);
+CREATE INDEX layers_created_at ON layers (created_at);
+CREATE INDEX layers_hash_rank ON layers (identifier, hash_rank);
+CREATE VIEW latest_layers AS
+    SELECT * FROM layers WHERE hash_rank = 0;
+"""
+
+
+def iter_sqlite_rows(*, fixed: FixedClassifiedLayers) -> Iterator[tuple]:
+    # all_layers is grouped by hash, newest first
+    hash_rank = -1
+    previous_hash = None
+    for position, layer in enumerate(fixed.all_layers):
+        if layer.hash != previous_hash:
+            hash_rank += 1
+            previous_hash = layer.hash
+        yield (
+            fixed.identifier,
+            position,
+            layer.hash,
+            hash_rank,
+            layer.packages,
+            layer.note,
+            layer.runtime,
+            ",".join(layer.architectures),
+            layer.layer_version_arn,
+            layer.created_at,
+            layer.region,
+        )
 
 
-def update_state():
+def save_sqlite(*, source_data: SourceData, path: str):
+    # built next to the target and renamed, readers never see a partial file.
+    # a throwaway file needs no journal, and the indexes are cheaper to
+    # build once after every row is inserted
+    tmp_path = f"{path}.tmp"
+    if exists(tmp_path):
+        remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(SQLITE_SCHEMA)
+        with connection:
+            connection.executemany(
+                "INSERT INTO identifiers VALUES (?, ?, ?)",
+                (
+                    (
+                        position,
+                        x.identifier,
+                        x.latest_layers[0].hash if x.latest_layers else None,
+                    )
+                    for position, x in enumerate(source_data.layers)
+                ),
+            )
+            connection.executemany(
+                "INSERT INTO layers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (row for x in source_data.layers for row in iter_sqlite_rows(fixed=x)),
+            )
+        connection.executescript(SQLITE_INDEXES)
+    finally:
+        connection.close()
+    replace(tmp_path, path)
+
+
+def update_state(*, env: EnvironmentVariables):
+    table: Table = get_resource("dynamodb").Table(env.table_name)
     dt_text = datetime.now(jst).isoformat()
     attributes = {
         "stateGenerate": "PUBLISHED",
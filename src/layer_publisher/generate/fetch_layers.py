@@ -1,60 +1,420 @@
 from __future__ import annotations
 
-import json
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import chain
 from os import makedirs
-from typing import TYPE_CHECKING
+from os.path import exists
+from typing import TYPE_CHECKING, Callable, Iterator
 
-import boto3
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 
+from layer_publisher.utils.aws import get_client
+from layer_publisher.utils.layer_records import (
+    FORMAT_JSON,
+    FORMAT_NDJSON,
+    generate_file_name,
+    iter_layer_records,
+    write_layer_records,
+)
+from layer_publisher.utils.profiler import profile_main, span
+from layer_publisher.utils.rate_controller import AdaptiveRateController
+from layer_publisher.utils.serialization import dump_file, dumps, load_file
+from layer_publisher.utils.variables import FILE_FETCH_STATE, REGIONS
+
 if TYPE_CHECKING:
     from mypy_boto3_lambda import LambdaClient
 
 
 class EnvironmentVariables(BaseSettings):
-    aws_default_region: str
+    aws_default_region: str | None = None
+    # comma separated region names, or "all" for every published region
+    fetch_regions: str | None = None
+    # upper bound, the rate controller finds the actual concurrency per region
+    fetch_concurrency: int = 8
+    fetch_initial_concurrency: int = 4
+    fetch_region_concurrency: int = 10
+    # dist/ of an earlier run (layers/<region>/layers.json and fetch_state.json),
+    # layers whose latest version did not move are carried over from there
+    fetch_previous_dir: str | None = None
+    # versions deleted since the snapshot are only dropped by a full fetch,
+    # the snapshot is ignored once the last full fetch is older than this
+    fetch_full_interval_hours: int = 168
+    # "json" or "ndjson" (one layer version per line, written as it arrives)
+    fetch_output_format: str = FORMAT_JSON
+
+
+class FetchState(BaseModel):
+    # saved next to the region files, the next run reads it from the snapshot
+    full_fetched_at: str
+
+
+@profile_main("fetch_layers")
+def main(*, client_factory: Callable[..., LambdaClient] | None = None):
+    env = EnvironmentVariables()
+    regions = resolve_regions(
+        fetch_regions=env.fetch_regions, default_region=env.aws_default_region
+    )
+    previous_dir, state = resolve_previous_dir(env=env, now=datetime.now(timezone.utc))
+    with ThreadPoolExecutor(
+        max_workers=max(min(env.fetch_region_concurrency, len(regions)), 1)
+    ) as executor:
+        list(
+            executor.map(
+                lambda x: fetch_region(
+                    region=x,
+                    concurrency=env.fetch_concurrency,
+                    initial_concurrency=env.fetch_initial_concurrency,
+                    previous_dir=previous_dir,
+                    output_format=env.fetch_output_format,
+                    client_factory=client_factory or create_client,
+                ),
+                regions,
+            )
+        )
+    save_fetch_state(state=state)
+
+
+def collect_regions(
+    *,
+    env: EnvironmentVariables,
+    previous_dir: str | None = None,
+    client_factory: Callable[..., LambdaClient] | None = None,
+) -> dict[str, list[dict]]:
+    # main() without files, region -> versions for an in-process pipeline.
+    # previous_dir comes from resolve_previous_dir()
+    regions = resolve_regions(
+        fetch_regions=env.fetch_regions, default_region=env.aws_default_region
+    )
+    with ThreadPoolExecutor(
+        max_workers=max(min(env.fetch_region_concurrency, len(regions)), 1)
+    ) as executor:
+        results = executor.map(
+            lambda x: collect_region(
+                region=x,
+                concurrency=env.fetch_concurrency,
+                initial_concurrency=env.fetch_initial_concurrency,
+                previous_dir=previous_dir,
+                client_factory=client_factory or create_client,
+            ),
+            regions,
+        )
+        return dict(zip(regions, results))
+
+
+def resolve_regions(
+    *, fetch_regions: str | None, default_region: str | None
+) -> list[str]:
+    if fetch_regions == "all":
+        return list(REGIONS)
+    if fetch_regions:
+        return [x.strip() for x in fetch_regions.split(",") if x.strip()]
+    if default_region:
+        return [default_region]
+    raise ValueError("either FETCH_REGIONS or AWS_DEFAULT_REGION is required")
+
 
+def load_fetch_state(*, previous_dir: str) -> FetchState | None:
+    path = f"{previous_dir}/{FILE_FETCH_STATE}"
+    if not exists(path):
+        return None
+    return FetchState(**load_file(path))
 
-env = EnvironmentVariables()
-client: LambdaClient = boto3.client("lambda")
 
+def save_fetch_state(*, state: FetchState):
+    makedirs("dist", exist_ok=True)
+    dump_file(f"dist/{FILE_FETCH_STATE}", state.model_dump(), indent=True)
 
-def main():
-    path = generate_path()
-    all_layer_names = list_layer_names()
-    layers = list_layer_versions(all_layer_names=all_layer_names)
-    with open(path, "w") as f:
-        json.dump(
-            {"region": env.aws_default_region, "layers": layers}, f, ensure_ascii=False
+
+def resolve_previous_dir(
+    *, env: EnvironmentVariables, now: datetime
+) -> tuple[str | None, FetchState]:
+    # (snapshot to carry unchanged layers from, state to save with this run).
+    # None lists every version again, then the full fetch starts a new interval
+    state = (
+        load_fetch_state(previous_dir=env.fetch_previous_dir)
+        if env.fetch_previous_dir
+        else None
+    )
+    if state is None or now - datetime.fromisoformat(
+        state.full_fetched_at
+    ) >= timedelta(hours=env.fetch_full_interval_hours):
+        print("full fetch")
+        return None, FetchState(full_fetched_at=now.isoformat())
+    print(f"incremental fetch, last full fetch at {state.full_fetched_at}")
+    return env.fetch_previous_dir, state
+
+
+def fetch_region(
+    *,
+    region: str,
+    concurrency: int,
+    initial_concurrency: int = 4,
+    previous_dir: str | None = None,
+    output_format: str = FORMAT_JSON,
+    client_factory: Callable[..., LambdaClient] | None = None,
+):
+    stats = {}
+    versions = iter_region(
+        region=region,
+        concurrency=concurrency,
+        initial_concurrency=initial_concurrency,
+        previous_dir=previous_dir,
+        client_factory=client_factory,
+        stats=stats,
+    )
+    # versions are fetched while they are written, so this covers both
+    with span("list_layer_versions"):
+        if output_format == FORMAT_NDJSON:
+            with open(
+                generate_path(region=region, output_format=output_format), "wb"
+            ) as f:
+                count = write_layer_records(f=f, region=region, records=versions)
+        else:
+            count = write_region(region=region, versions=list(versions))
+    print_region_stats(region=region, stats=stats, count=count)
+
+
+def collect_region(
+    *,
+    region: str,
+    concurrency: int,
+    initial_concurrency: int = 4,
+    previous_dir: str | None = None,
+    client_factory: Callable[..., LambdaClient] | None = None,
+) -> list[dict]:
+    # the same as fetch_region, but the versions are kept in memory
+    stats = {}
+    with span("list_layer_versions"):
+        versions = list(
+            iter_region(
+                region=region,
+                concurrency=concurrency,
+                initial_concurrency=initial_concurrency,
+                previous_dir=previous_dir,
+                client_factory=client_factory,
+                stats=stats,
+            )
+        )
+    print_region_stats(region=region, stats=stats, count=len(versions))
+    return versions
+
+
+def iter_region(
+    *,
+    region: str,
+    concurrency: int,
+    initial_concurrency: int,
+    previous_dir: str | None,
+    client_factory: Callable[..., LambdaClient] | None,
+    stats: dict,
+) -> Iterator[dict]:
+    # every version of the region in output order. stats gets the layer
+    # counts and the rate controller, for print_region_stats
+    client = (client_factory or create_client)(
+        region=region, max_pool_connections=concurrency
+    )
+    controller = AdaptiveRateController(
+        initial_concurrency=initial_concurrency, max_concurrency=concurrency
+    )
+    stats["controller"] = controller
+    with span("list_layers"):
+        all_layers = list_layers(client=client, controller=controller)
+    with span("load_previous_versions"):
+        previous = (
+            load_previous_versions(
+                path=find_previous_path(dirname=f"{previous_dir}/layers/{region}")
+            )
+            if previous_dir
+            else {}
         )
+    carried = find_unchanged_layers(all_layers=all_layers, previous=previous)
+    stats["layers"] = len(all_layers)
+    stats["unchanged"] = len(carried)
+    for versions in iter_layer_versions(
+        client=client,
+        all_layer_names=[x["LayerName"] for x in all_layers],
+        max_workers=concurrency,
+        carried=carried,
+        controller=controller,
+    ):
+        yield from versions
+
+
+def write_region(
+    *, region: str, versions: list[dict], output_format: str = FORMAT_JSON
+) -> int:
+    with open(generate_path(region=region, output_format=output_format), "wb") as f:
+        if output_format == FORMAT_NDJSON:
+            return write_layer_records(f=f, region=region, records=versions)
+        f.write(dumps({"region": region, "layers": versions}))
+    return len(versions)
+
+
+def print_region_stats(*, region: str, stats: dict, count: int):
+    controller_stats = stats["controller"].stats
+    print(
+        f"{region}: {stats['layers']} layers ({stats['unchanged']} unchanged), "
+        f"{count} versions, {controller_stats.calls} calls, "
+        f"{controller_stats.throttles} throttles, {controller_stats.retries} "
+        f"retries, concurrency {controller_stats.concurrency:.1f} "
+        f"(peak {controller_stats.peak_concurrency})"
+    )
 
 
-def generate_path() -> str:
-    dirname = f"dist/layers/{env.aws_default_region}"
+def create_client(*, region: str, max_pool_connections: int) -> LambdaClient:
+    # one connection per worker, otherwise urllib3 discards the extra ones.
+    # retries are left to AdaptiveRateController, which also sees throttles
+    return get_client(
+        "lambda",
+        region=region,
+        max_pool_connections=max_pool_connections,
+        total_max_attempts=1,
+    )
+
+
+def generate_path(*, region: str, output_format: str = FORMAT_JSON) -> str:
+    dirname = f"dist/layers/{region}"
     makedirs(dirname, exist_ok=True)
-    return f"{dirname}/layers.json"
+    return f"{dirname}/{generate_file_name(output_format=output_format)}"
+
 
+def paginate(
+    *, controller: AdaptiveRateController, operation: Callable[..., dict], **kwargs
+) -> Iterator[dict]:
+    # same as client.get_paginator(), but every page goes through the controller
+    marker = None
+    while True:
+        params = {**kwargs, "Marker": marker} if marker else kwargs
+        with span("fetch_page"):
+            resp = controller.call(operation, **params)
+        yield resp
+        marker = resp.get("NextMarker")
+        if not marker:
+            break
 
-def list_layer_names() -> list[str]:
+
+def list_layers(
+    *, client: LambdaClient, controller: AdaptiveRateController
+) -> list[dict]:
     result = []
 
-    for resp in client.get_paginator("list_layers").paginate():
-        result += [x["LayerName"] for x in resp["Layers"]]
+    for resp in paginate(controller=controller, operation=client.list_layers):
+        result += [x for x in resp["Layers"]]
+
+    return result
+
+
+def parse_layer_name(*, layer_version_arn: str) -> str:
+    # arn:aws:lambda:<region>:<account>:layer:<name>:<version>
+    return layer_version_arn.split(":")[6]
+
+
+def find_previous_path(*, dirname: str) -> str | None:
+    for output_format in [FORMAT_NDJSON, FORMAT_JSON]:
+        path = f"{dirname}/{generate_file_name(output_format=output_format)}"
+        if exists(path):
+            return path
+    return None
+
+
+def load_previous_versions(*, path: str | None) -> dict[str, list[dict]]:
+    if path is None or not exists(path):
+        return {}
 
+    result: dict[str, list[dict]] = {}
+    for _, version in iter_layer_records(path=path):
+        name = parse_layer_name(layer_version_arn=version["LayerVersionArn"])
+        result.setdefault(name, []).append(version)
     return result
 
 
-def list_layer_versions(*, all_layer_names: list[str]) -> list[dict]:
+def find_unchanged_layers(
+    *, all_layers: list[dict], previous: dict[str, list[dict]]
+) -> dict[str, list[dict]]:
+    # a layer whose latest version number did not move has the same history,
+    # except for deleted old versions, which are only picked up by a full run
+    result = {}
+    for layer in all_layers:
+        versions = previous.get(layer["LayerName"])
+        if not versions:
+            continue
+        latest = layer["LatestMatchingVersion"]["Version"]
+        if max(x["Version"] for x in versions) == latest:
+            result[layer["LayerName"]] = versions
+    return result
+
+
+def list_versions_of_layer(
+    *, client: LambdaClient, controller: AdaptiveRateController, layer_name: str
+) -> list[dict]:
     result = []
 
-    for layer_name in all_layer_names:
-        for resp in client.get_paginator("list_layer_versions").paginate(
-            LayerName=layer_name
-        ):
-            result += [x for x in resp["LayerVersions"]]
+    for resp in paginate(
+        controller=controller,
+        operation=client.list_layer_versions,
+        LayerName=layer_name,
+    ):
+        result += [x for x in resp["LayerVersions"]]
 
     return result
 
 
+def iter_layer_versions(
+    *,
+    client: LambdaClient,
+    all_layer_names: list[str],
+    max_workers: int,
+    carried: dict[str, list[dict]] | None = None,
+    controller: AdaptiveRateController | None = None,
+) -> Iterator[list[dict]]:
+    carried = carried or {}
+    max_workers = max(max_workers, 1)
+    controller = controller or AdaptiveRateController(
+        initial_concurrency=max_workers, max_concurrency=max_workers
+    )
+
+    def run(layer_name: str) -> list[dict]:
+        if layer_name in carried:
+            return carried[layer_name]
+        return list_versions_of_layer(
+            client=client, controller=controller, layer_name=layer_name
+        )
+
+    # yields in input order, so the output stays deterministic; the window
+    # bounds how many finished layers wait in memory for a slow one
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        window: deque[Future[list[dict]]] = deque()
+        for layer_name in all_layer_names:
+            if len(window) >= max_workers * 2:
+                yield window.popleft().result()
+            window.append(executor.submit(run, layer_name))
+        while window:
+            yield window.popleft().result()
+
+
+def list_layer_versions(
+    *,
+    client: LambdaClient,
+    all_layer_names: list[str],
+    max_workers: int,
+    carried: dict[str, list[dict]] | None = None,
+    controller: AdaptiveRateController | None = None,
+) -> list[dict]:
+    return list(
+        chain.from_iterable(
+            iter_layer_versions(
+                client=client,
+                all_layer_names=all_layer_names,
+                max_workers=max_workers,
+                carried=carried,
+                controller=controller,
+            )
+        )
+    )
+
+
 if __name__ == "__main__":
     main()
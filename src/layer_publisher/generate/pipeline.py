@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Callable, Iterator
+
+from pydantic import BaseModel
+from pydantic_settings import BaseSettings
+
+import layer_publisher.generate.complete_generate as complete_generate
+import layer_publisher.generate.fetch_layers as fetch_layers
+import layer_publisher.generate.start_generate as start_generate
+from layer_publisher.utils.profiler import profile_main, span
+
+if TYPE_CHECKING:
+    from mypy_boto3_lambda import LambdaClient
+
+STAGE_START_GENERATE = "start_generate"
+STAGE_FETCH_LAYERS = "fetch_layers"
+STAGE_COMPLETE_GENERATE = "complete_generate"
+STAGES = [STAGE_START_GENERATE, STAGE_FETCH_LAYERS, STAGE_COMPLETE_GENERATE]
+
+
+class EnvironmentVariables(BaseSettings):
+    # comma separated subset of STAGES, always run in the order of STAGES
+    pipeline_stages: str = ",".join(STAGES)
+    # also write layer.json and dist/layers/<region>/layers.json, the files
+    # the separate steps hand over to each other
+    pipeline_write_files: bool = False
+
+
+class StageTiming(BaseModel):
+    name: str
+    wall_seconds: float
+    cpu_seconds: float
+
+
+def parse_stages(*, pipeline_stages: str) -> list[str]:
+    names = {x.strip() for x in pipeline_stages.split(",") if x.strip()}
+    unknown = names - set(STAGES)
+    if unknown:
+        raise ValueError(f"unknown pipeline stages: {sorted(unknown)}")
+    return [x for x in STAGES if x in names]
+
+
+@contextmanager
+def measure_stage(*, name: str, timings: list[StageTiming]) -> Iterator[None]:
+    started_at = time.perf_counter()
+    cpu_started_at = time.process_time()
+    with span(name):
+        yield
+    timings.append(
+        StageTiming(
+            name=name,
+            wall_seconds=time.perf_counter() - started_at,
+            cpu_seconds=time.process_time() - cpu_started_at,
+        )
+    )
+
+
+def iter_region_records(
+    *, versions: dict[str, list[dict]]
+) -> Iterator[tuple[str, dict]]:
+    # in the order of the region files, so the output matches a run which
+    # reads layers/<region>/layers.json
+    for region in sorted(versions):
+        for x in versions[region]:
+            yield region, x
+
+
+@profile_main("pipeline")
+def main(*, client_factory: Callable[..., LambdaClient] | None = None):
+    env = EnvironmentVariables()
+    timings = run(
+        stages=parse_stages(pipeline_stages=env.pipeline_stages),
+        write_files=env.pipeline_write_files,
+        client_factory=client_factory,
+    )
+    for x in timings:
+        print(f"stage {x.name}: {x.wall_seconds:.3f}s wall, {x.cpu_seconds:.3f}s cpu")
+
+
+def run(
+    *,
+    stages: list[str],
+    write_files: bool = False,
+    client_factory: Callable[..., LambdaClient] | None = None,
+) -> list[StageTiming]:
+    # start_generate -> fetch_layers -> complete_generate in one process,
+    # the fetched versions go to complete_generate without a file in between
+    timings: list[StageTiming] = []
+    versions: dict[str, list[dict]] | None = None
+
+    if STAGE_START_GENERATE in stages:
+        with measure_stage(name=STAGE_START_GENERATE, timings=timings):
+            layer = start_generate.update_state(
+                env=start_generate.EnvironmentVariables()
+            )
+            if write_files:
+                start_generate.save_layer(layer=layer)
+
+    if STAGE_FETCH_LAYERS in stages:
+        with measure_stage(name=STAGE_FETCH_LAYERS, timings=timings):
+            fetch_env = fetch_layers.EnvironmentVariables()
+            previous_dir, state = fetch_layers.resolve_previous_dir(
+                env=fetch_env, now=datetime.now(timezone.utc)
+            )
+            versions = fetch_layers.collect_regions(
+                env=fetch_env, previous_dir=previous_dir, client_factory=client_factory
+            )
+            if write_files:
+                fetch_layers.save_fetch_state(state=state)
+                for region, x in versions.items():
+                    fetch_layers.write_region(
+                        region=region,
+                        versions=x,
+                        output_format=fetch_env.fetch_output_format,
+                    )
+
+    if STAGE_COMPLETE_GENERATE in stages:
+        with measure_stage(name=STAGE_COMPLETE_GENERATE, timings=timings):
+            complete_generate.run(
+                env=complete_generate.EnvironmentVariables(),
+                records=None
+                if versions is None
+                else iter_region_records(versions=versions),
+            )
+
+    return timings
+
+
+if __name__ == "__main__":
+    main()
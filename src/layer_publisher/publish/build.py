@@ -3,6 +3,7 @@ from typing import TypedDict
 from pydantic_settings import BaseSettings
 
 from layer_publisher.utils.models import BuildConfig, Layer
+from layer_publisher.utils.profiler import profile_main, span
 from layer_publisher.utils.variables import FILE_INSTALL_SCRIPT
 
 
@@ -10,6 +11,8 @@ class EnvironmentVariables(BaseSettings):
     my_runner_name: str
     max_concurrency: int
     concurrency_index: int
+    # JSON array of layer.json entries, built into modules/<identifier>/
+    publish_batch_file: str | None = None
 
 
 class BaseLines(TypedDict):
@@ -17,32 +20,47 @@ class BaseLines(TypedDict):
     amd: list[str]
 
 
+@profile_main("build")
 def main():
     env = EnvironmentVariables()
-    config = BuildConfig.load()
-    layer = Layer.load()
-    print(layer)
+    is_batch = env.publish_batch_file is not None
+    with span("load_config"):
+        config = BuildConfig.load()
+        layers = (
+            Layer.load_batch(env.publish_batch_file) if is_batch else [Layer.load()]
+        )
+    print(layers)
     print(env)
     print("=" * 20)
-    base_lines = generate_lines(
-        layer=layer,
-        all_runtimes=config.runtimes,
-    )
-    lines = filter_lines(
-        base_lines=base_lines, env=env, is_architecture_split=layer.isArchitectureSplit
-    )
-    write_script(lines=lines)
+    with span("generate_script"):
+        lines = []
+        for layer in layers:
+            base_lines = generate_lines(
+                layer=layer,
+                all_runtimes=config.runtimes,
+                is_batch=is_batch,
+            )
+            lines += filter_lines(
+                base_lines=base_lines,
+                env=env,
+                is_architecture_split=layer.isArchitectureSplit,
+            )
+        write_script(lines=lines)
 
 
-def generate_lines(*, layer: Layer, all_runtimes: list[str]) -> BaseLines:
+def generate_lines(
+    *, layer: Layer, all_runtimes: list[str], is_batch: bool = False
+) -> BaseLines:
     result = {"amd": [], "arm": []}
     text_packages = " ".join(layer.packages)
+    # a batch stack reads modules/<identifier>/<arch>/<runtime>
+    option = f" --identifier {layer.identifier}" if is_batch else ""
     for arch in result.keys():
         for runtime in all_runtimes:
             if runtime in layer.get_ignore_versions():
                 continue
             result[arch].append(
-                f"./build.sh --packages {text_packages} --arch {arch} --runtime {runtime}"
+                f"./build.sh --packages {text_packages} --arch {arch} --runtime {runtime}{option}"
             )
     return result
 
@@ -5,9 +5,11 @@ from datetime import datetime
 from typing import TYPE_CHECKING
 from zoneinfo import ZoneInfo
 
-import boto3
 from pydantic_settings import BaseSettings
 
+from layer_publisher.utils.aws import get_resource
+from layer_publisher.utils.profiler import profile_main, span
+
 if TYPE_CHECKING:
     from mypy_boto3_dynamodb.service_resource import Table
 
@@ -18,31 +20,40 @@ class EnvironmentVariables(BaseSettings):
 
 
 jst = ZoneInfo("Asia/Tokyo")
-env = EnvironmentVariables()
-
-table: Table = boto3.resource("dynamodb").Table(env.table_name)
-
-dt_text = datetime.now(jst).isoformat()
-
-attributes = {
-    "stateLayer": "PUBLISHED",
-    "updatedAt": dt_text,
-    "lastPublishedAt": dt_text,
-}
-
-resp = table.update_item(
-    Key={"identifier": env.identifier},
-    UpdateExpression="set " + ", ".join([f"#{k} = :{k}" for k in attributes.keys()]),
-    ExpressionAttributeNames={f"#{k}": k for k in attributes.keys()},
-    ExpressionAttributeValues={f":{k}": v for k, v in attributes.items()},
-    ReturnValues="ALL_NEW",
-)
-
-print(
-    json.dumps(
-        resp,
-        indent=2,
-        ensure_ascii=False,
-        default=lambda x: {"type": str(type(x)), "value": str(x)},
+
+
+@profile_main("finish_publish")
+def main():
+    env = EnvironmentVariables()
+    with span("update_state"):
+        resp = update_state(env=env)
+    print(
+        json.dumps(
+            resp,
+            indent=2,
+            ensure_ascii=False,
+            default=lambda x: {"type": str(type(x)), "value": str(x)},
+        )
+    )
+
+
+def update_state(*, env: EnvironmentVariables) -> dict:
+    table: Table = get_resource("dynamodb").Table(env.table_name)
+    dt_text = datetime.now(jst).isoformat()
+    attributes = {
+        "stateLayer": "PUBLISHED",
+        "updatedAt": dt_text,
+        "lastPublishedAt": dt_text,
+    }
+    return table.update_item(
+        Key={"identifier": env.identifier},
+        UpdateExpression="set "
+        + ", ".join([f"#{k} = :{k}" for k in attributes.keys()]),
+        ExpressionAttributeNames={f"#{k}": k for k in attributes.keys()},
+        ExpressionAttributeValues={f":{k}": v for k, v in attributes.items()},
+        ReturnValues="ALL_NEW",
     )
-)
+
+
+if __name__ == "__main__":
+    main()
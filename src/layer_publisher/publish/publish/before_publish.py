@@ -2,20 +2,29 @@ from __future__ import annotations
 
 import json
 import os
+import re
 from enum import Enum
 from hashlib import sha3_224
 from typing import TYPE_CHECKING
 
-import boto3
 from humps import pascalize
 from pydantic import BaseModel
+from pydantic_settings import BaseSettings
 
+from layer_publisher.utils.aws import get_account_id, get_client
 from layer_publisher.utils.models import BuildConfig, Layer
+from layer_publisher.utils.profiler import profile_main, span
 from layer_publisher.utils.s3 import generate_bucket_name
 
 if TYPE_CHECKING:
     from mypy_boto3_s3 import S3Client
-    from mypy_boto3_sts import STSClient
+
+# CloudFormation allows 500 resources and a 1 MB template (from S3) per stack,
+# leave room for what the Serverless transform adds
+MAX_STACK_RESOURCES = 400
+MAX_TEMPLATE_BYTES = 800_000
+# stacks of a batch deployed at the same time
+DEFAULT_DEPLOY_CONCURRENCY = 4
 
 
 class Architecture(Enum):
@@ -31,44 +40,102 @@ class DescriptionData(BaseModel):
     note: str | None = None
 
 
-sts: STSClient = boto3.client("sts")
-s3: S3Client = boto3.client("s3")
+class EnvironmentVariables(BaseSettings):
+    # JSON array of layer.json entries, published together in one stack
+    publish_batch_file: str | None = None
+    # stack name suffix of the batch, keep it stable between runs
+    publish_batch_name: str | None = None
+    # the batch is split into at least this many stacks, more are added only
+    # when a stack would go over MAX_STACK_RESOURCES / MAX_TEMPLATE_BYTES.
+    # an added stack only takes identifiers over, the others stay where they are
+    publish_batch_partitions: int = 1
+    # at most this many `package && deploy` of the batch run at once
+    publish_deploy_concurrency: int = DEFAULT_DEPLOY_CONCURRENCY
+
+
+class TemplateTarget(BaseModel):
+    # one identifier of a template
+    desc_data: DescriptionData
+    all_architectures: list[Architecture]
+    target_runtimes: list[str]
 
 
+class TemplatePartition(BaseModel):
+    index: int
+    # total number of partitions of the batch, empty ones are not emitted
+    partitions: int
+    identifiers: list[str]
+    template: str
+
+
+@profile_main("before_publish")
 def main():
-    account_id = get_account_id()
+    with span("get_account_id"):
+        account_id = get_account_id()
     region = load_region()
     bucket_name = generate_bucket_name(account_id=account_id, region=region)
-    create_bucket(bucket_name=bucket_name, region=region)
+    with span("s3_create_bucket"):
+        create_bucket(bucket_name=bucket_name, region=region)
+
+    env = EnvironmentVariables()
+    if env.publish_batch_file and not env.publish_batch_name:
+        raise ValueError("PUBLISH_BATCH_NAME is required with PUBLISH_BATCH_FILE")
 
     # generate sam template
-    layer = Layer.load()
-    config = BuildConfig.load()
-    target_runtimes = filter_runtimes(
-        all_runtimes=config.runtimes, ignore_versions=layer.get_ignore_versions()
-    )
-    desc_data = calc_description_data(layer=layer)
-    all_architectures = calc_architectures(
-        is_architecture_split=layer.isArchitectureSplit
-    )
-    sam = generate_template(
-        all_architectures=all_architectures,
-        target_runtimes=target_runtimes,
-        desc_data=desc_data,
-    )
+    with span("load_config"):
+        layers = (
+            Layer.load_batch(env.publish_batch_file)
+            if env.publish_batch_file
+            else [Layer.load()]
+        )
+        config = BuildConfig.load()
+    targets = [
+        calc_template_target(layer=x, all_runtimes=config.runtimes) for x in layers
+    ]
 
-    with open("sam.yml", "w") as f:
-        f.write(sam)
+    if not env.publish_batch_file:
+        with span("generate_template"):
+            sam = generate_template(targets=targets)
 
-    script = generate_script(bucket_name=bucket_name, identifier=desc_data.identifier)
+        with open("sam.yml", "w") as f:
+            f.write(sam)
+
+        script = generate_script(
+            bucket_name=bucket_name, identifier=targets[0].desc_data.identifier
+        )
+    else:
+        with span("generate_template"):
+            partitions = partition_templates(
+                targets=targets, min_partitions=env.publish_batch_partitions
+            )
+
+        for x in partitions:
+            template_file, _ = generate_partition_file_names(index=x.index)
+            with open(template_file, "w") as f:
+                f.write(x.template)
+            print(f"{template_file}: {', '.join(x.identifiers)}")
+
+        script = generate_script(
+            bucket_name=bucket_name,
+            batch_name=env.publish_batch_name,
+            partitions=partitions,
+            concurrency=env.publish_deploy_concurrency,
+        )
 
     with open("deploy.sh", "w") as f:
         f.write(script)
 
 
-def get_account_id() -> str:
-    resp = sts.get_caller_identity()
-    return resp["Account"]
+def calc_template_target(*, layer: Layer, all_runtimes: list[str]) -> TemplateTarget:
+    return TemplateTarget(
+        desc_data=calc_description_data(layer=layer),
+        all_architectures=calc_architectures(
+            is_architecture_split=layer.isArchitectureSplit
+        ),
+        target_runtimes=filter_runtimes(
+            all_runtimes=all_runtimes, ignore_versions=layer.get_ignore_versions()
+        ),
+    )
 
 
 def load_region() -> str:
@@ -76,6 +143,7 @@ def load_region() -> str:
 
 
 def create_bucket(*, bucket_name: str, region: str):
+    s3: S3Client = get_client("s3", region=region)
     try:
         if region == "us-east-1":
             s3.create_bucket(Bucket=bucket_name)
@@ -121,14 +189,29 @@ def generate_logical_name_suffix(*, arch: Architecture, runtime: str) -> str:
     )
 
 
-def generate_logical_name_layer(*, arch: Architecture, runtime: str) -> str:
-    return f"Layer{generate_logical_name_suffix(arch=arch, runtime=runtime)}"
+def generate_logical_name_prefix(*, identifier: str) -> str:
+    # only batch templates prefix the logical names, one identifier per stack
+    # keeps its resources (and their physical layer versions) as they are
+    return pascalize(re.sub(r"[^0-9A-Za-z]+", "-", identifier))
+
+
+def generate_logical_name_layer(
+    *, arch: Architecture, runtime: str, logical_name_prefix: str = ""
+) -> str:
+    return "Layer{prefix}{suffix}".format(
+        prefix=logical_name_prefix,
+        suffix=generate_logical_name_suffix(arch=arch, runtime=runtime),
+    )
 
 
-def _generate_layer_content_uri(*, arch: Architecture, runtime: str) -> list[str]:
+def _generate_layer_content_uri(
+    *, arch: Architecture, runtime: str, content_dir: str = "modules"
+) -> list[str]:
     return [
-        "      ContentUri: modules/{arch}/{runtime}".format(
-            arch="arm" if arch == Architecture.ARM else "amd", runtime=runtime
+        "      ContentUri: {content_dir}/{arch}/{runtime}".format(
+            content_dir=content_dir,
+            arch="arm" if arch == Architecture.ARM else "amd",
+            runtime=runtime,
         )
     ]
 
@@ -170,16 +253,27 @@ def _generate_layer_description(*, desc_data: DescriptionData) -> list[str]:
 
 
 def generate_layer(
-    *, arch: Architecture, runtime: str, desc_data: DescriptionData
+    *,
+    arch: Architecture,
+    runtime: str,
+    desc_data: DescriptionData,
+    logical_name_prefix: str = "",
+    content_dir: str = "modules",
 ) -> list[str]:
     # modules/<{amd, arm}>/<{python3.13, python3.12}>/python
     lines = [
-        "  {}:".format(generate_logical_name_layer(arch=arch, runtime=runtime)),
+        "  {}:".format(
+            generate_logical_name_layer(
+                arch=arch, runtime=runtime, logical_name_prefix=logical_name_prefix
+            )
+        ),
         "    Type: AWS::Serverless::LayerVersion",
         "    Properties:",
         "      RetentionPolicy: Retain",
     ]
-    lines += _generate_layer_content_uri(arch=arch, runtime=runtime)
+    lines += _generate_layer_content_uri(
+        arch=arch, runtime=runtime, content_dir=content_dir
+    )
     lines += _generate_layer_layer_name(
         identifier=desc_data.identifier, arch=arch, runtime=runtime
     )
@@ -190,22 +284,35 @@ def generate_layer(
     return lines
 
 
-def _generate_permission_logical_name(*, arch: Architecture, runtime: str) -> list[str]:
-    return [f"  Permission{generate_logical_name_suffix(arch=arch, runtime=runtime)}:"]
+def _generate_permission_logical_name(
+    *, arch: Architecture, runtime: str, logical_name_prefix: str = ""
+) -> list[str]:
+    return [
+        "  Permission{prefix}{suffix}:".format(
+            prefix=logical_name_prefix,
+            suffix=generate_logical_name_suffix(arch=arch, runtime=runtime),
+        )
+    ]
 
 
 def _generate_permission_layer_version_arn(
-    *, arch: Architecture, runtime: str
+    *, arch: Architecture, runtime: str, logical_name_prefix: str = ""
 ) -> list[str]:
     return [
         "      LayerVersionArn: !Ref {logical_name}".format(
-            logical_name=generate_logical_name_layer(arch=arch, runtime=runtime)
+            logical_name=generate_logical_name_layer(
+                arch=arch, runtime=runtime, logical_name_prefix=logical_name_prefix
+            )
         )
     ]
 
 
-def generate_permission(*, arch: Architecture, runtime: str):
-    lines = _generate_permission_logical_name(arch=arch, runtime=runtime)
+def generate_permission(
+    *, arch: Architecture, runtime: str, logical_name_prefix: str = ""
+):
+    lines = _generate_permission_logical_name(
+        arch=arch, runtime=runtime, logical_name_prefix=logical_name_prefix
+    )
     lines += [
         "    Type: AWS::Lambda::LayerVersionPermission",
         "    DeletionPolicy: Retain",
@@ -214,39 +321,250 @@ def generate_permission(*, arch: Architecture, runtime: str):
         "      Action: lambda:GetLayerVersion",
         "      Principal: '*'",
     ]
-    lines += _generate_permission_layer_version_arn(arch=arch, runtime=runtime)
+    lines += _generate_permission_layer_version_arn(
+        arch=arch, runtime=runtime, logical_name_prefix=logical_name_prefix
+    )
     lines += [""]
     return lines
 
 
-def generate_template(
-    *,
-    all_architectures: list[Architecture],
-    target_runtimes: list[str],
-    desc_data: DescriptionData,
-) -> str:
-    lines = ["Transform: AWS::Serverless-2016-10-31", "Resources:"]
+def generate_template(*, targets: list[TemplateTarget], is_batch: bool = False) -> str:
+    # a batch prefixes the logical names with the identifier and reads the
+    # modules from modules/<identifier>/, one identifier keeps them as they are
+    if is_batch:
+        check_logical_name_prefixes(targets=targets)
+    return _join_template(
+        chunks=[_generate_target_chunk(target=x, is_batch=is_batch) for x in targets]
+    )
 
-    for arch in all_architectures:
-        for runtime in target_runtimes:
-            lines += generate_layer(arch=arch, runtime=runtime, desc_data=desc_data)
-            lines += generate_permission(arch=arch, runtime=runtime)
 
+def check_logical_name_prefixes(*, targets: list[TemplateTarget]):
+    prefixes = {}
+    for target in targets:
+        identifier = target.desc_data.identifier
+        prefix = generate_logical_name_prefix(identifier=identifier)
+        if prefix in prefixes:
+            raise ValueError(
+                f"{identifier} and {prefixes[prefix]} have the same logical names"
+            )
+        prefixes[prefix] = identifier
+
+
+def _generate_target_chunk(*, target: TemplateTarget, is_batch: bool) -> str:
+    identifier = target.desc_data.identifier
+    prefix = generate_logical_name_prefix(identifier=identifier) if is_batch else ""
+    content_dir = f"modules/{identifier}" if is_batch else "modules"
+    lines = []
+    for arch in target.all_architectures:
+        for runtime in target.target_runtimes:
+            lines += generate_layer(
+                arch=arch,
+                runtime=runtime,
+                desc_data=target.desc_data,
+                logical_name_prefix=prefix,
+                content_dir=content_dir,
+            )
+            lines += generate_permission(
+                arch=arch, runtime=runtime, logical_name_prefix=prefix
+            )
     return "\n".join(lines)
 
 
-def generate_script(*, bucket_name: str, identifier: str) -> str:
+def _join_template(*, chunks: list[str]) -> str:
     return "\n".join(
-        [
-            "aws cloudformation package --s3-bucket {bucket_name} --template-file sam.yml --output-template-file template.yml".format(
-                bucket_name=bucket_name
+        ["Transform: AWS::Serverless-2016-10-31", "Resources:", *filter(None, chunks)]
+    )
+
+
+def count_resources(*, target: TemplateTarget) -> int:
+    # a LayerVersion and a LayerVersionPermission per arch and runtime
+    return 2 * len(target.all_architectures) * len(target.target_runtimes)
+
+
+def calc_partition_score(*, identifier: str, index: int) -> int:
+    # rendezvous hashing, sha3 instead of hash(), which is salted per process
+    digest = sha3_224(f"{index}:{identifier}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def assign_partitions(
+    *,
+    identifiers: list[str],
+    resources: list[int],
+    sizes: list[int],
+    partitions: int,
+    max_resources: int,
+    max_bytes: int,
+) -> list[int] | None:
+    # every identifier goes to its highest scoring partition, or to the next
+    # one by score with room when that is full. the score of a partition
+    # does not depend on the count, so a new partition only takes the
+    # identifiers which score highest on it and the others stay
+    group_resources = [0] * partitions
+    group_sizes = [0] * partitions
+    result = [0] * len(identifiers)
+    for i in sorted(range(len(identifiers)), key=lambda i: identifiers[i]):
+        preferences = sorted(
+            range(partitions),
+            key=lambda index: calc_partition_score(
+                identifier=identifiers[i], index=index
             ),
-            "sam deploy --stack-name Layer{pascalize_identifier} --template-file template.yml --role-arn $CLOUDFORMATION_ROLE_ARN".format(
-                pascalize_identifier=pascalize(identifier)
+            reverse=True,
+        )
+        for index in preferences:
+            if (
+                group_resources[index] + resources[i] <= max_resources
+                and group_sizes[index] + sizes[i] <= max_bytes
+            ):
+                group_resources[index] += resources[i]
+                group_sizes[index] += sizes[i]
+                result[i] = index
+                break
+        else:
+            return None
+    return result
+
+
+def partition_templates(
+    *,
+    targets: list[TemplateTarget],
+    min_partitions: int = 1,
+    max_resources: int = MAX_STACK_RESOURCES,
+    max_bytes: int = MAX_TEMPLATE_BYTES,
+) -> list[TemplatePartition]:
+    # the same identifiers and partition count always give the same stacks,
+    # the count only grows while some stack is over the budget
+    check_logical_name_prefixes(targets=targets)
+    # every identifier is rendered once, partitions are sized by adding up
+    chunks = [_generate_target_chunk(target=x, is_batch=True) for x in targets]
+    resources = [count_resources(target=x) for x in targets]
+    # +1 for the newline joining the chunk to the template
+    sizes = [len(x.encode()) + 1 for x in chunks]
+    header_size = len(_join_template(chunks=[]).encode())
+    for target, x, size in zip(targets, resources, sizes):
+        if x > max_resources or header_size + size > max_bytes:
+            raise ValueError(
+                f"{target.desc_data.identifier} alone has {x} resources / "
+                f"{header_size + size} bytes, over {max_resources} / {max_bytes}"
+            )
+
+    partitions = max(min_partitions, 1, -(-sum(resources) // max_resources))
+    while True:
+        indexes = assign_partitions(
+            identifiers=[x.desc_data.identifier for x in targets],
+            resources=resources,
+            sizes=sizes,
+            partitions=partitions,
+            max_resources=max_resources,
+            max_bytes=max_bytes - header_size,
+        )
+        if indexes is not None:
+            break
+        # with as many partitions as identifiers there is always a free one
+        partitions += 1
+
+    return [
+        TemplatePartition(
+            index=index,
+            partitions=partitions,
+            identifiers=[
+                x.desc_data.identifier for x, y in zip(targets, indexes) if y == index
+            ],
+            template=_join_template(
+                chunks=[x for x, y in zip(chunks, indexes) if y == index]
             ),
-        ]
+        )
+        for index in range(partitions)
+        if index in indexes
+    ]
+
+
+def generate_partition_file_names(*, index: int) -> tuple[str, str]:
+    # (template, packaged template)
+    return f"sam_{index}.yml", f"template_{index}.yml"
+
+
+def generate_batch_stack_name(*, name: str, index: int) -> str:
+    # Part<index> even for a single partition, growing to two keeps the stack
+    return f"LayerBatch{pascalize(name)}Part{index}"
+
+
+def generate_script(
+    *,
+    bucket_name: str,
+    identifier: str | None = None,
+    batch_name: str | None = None,
+    partitions: list[TemplatePartition] | None = None,
+    concurrency: int = DEFAULT_DEPLOY_CONCURRENCY,
+) -> str:
+    # one identifier deploys sam.yml as Layer<Identifier>, a batch deploys
+    # every partition as LayerBatch<Name>Part<index>
+    if partitions is None:
+        return generate_deploy_script(
+            bucket_name=bucket_name, stack_name=f"Layer{pascalize(identifier)}"
+        )
+    return _generate_partitioned_script(
+        bucket_name=bucket_name,
+        name=batch_name,
+        partitions=partitions,
+        concurrency=concurrency,
     )
 
 
+def generate_deploy_script(*, bucket_name: str, stack_name: str) -> str:
+    return "\n".join(
+        _generate_deploy_lines(
+            bucket_name=bucket_name,
+            stack_name=stack_name,
+            template_file="sam.yml",
+            output_template_file="template.yml",
+        )
+    )
+
+
+def _generate_deploy_lines(
+    *, bucket_name: str, stack_name: str, template_file: str, output_template_file: str
+) -> list[str]:
+    return [
+        "aws cloudformation package --s3-bucket {bucket_name} --template-file {template_file} --output-template-file {output_template_file}".format(
+            bucket_name=bucket_name,
+            template_file=template_file,
+            output_template_file=output_template_file,
+        ),
+        "sam deploy --stack-name {stack_name} --template-file {output_template_file} --role-arn $CLOUDFORMATION_ROLE_ARN".format(
+            stack_name=stack_name, output_template_file=output_template_file
+        ),
+    ]
+
+
+def _generate_partitioned_script(
+    *,
+    bucket_name: str,
+    name: str,
+    partitions: list[TemplatePartition],
+    concurrency: int,
+) -> str:
+    # the stacks are independent, deploy them in waves of at most
+    # `concurrency` (POSIX sh, run as `sh deploy.sh`) and fail when any of
+    # them failed
+    wait_lines = ['for pid in $pids; do wait "$pid" || status=1; done', 'pids=""']
+    lines = ["status=0", 'pids=""']
+    for i, x in enumerate(partitions):
+        if i and i % max(concurrency, 1) == 0:
+            lines += wait_lines
+        template_file, output_template_file = generate_partition_file_names(
+            index=x.index
+        )
+        package, deploy = _generate_deploy_lines(
+            bucket_name=bucket_name,
+            stack_name=generate_batch_stack_name(name=name, index=x.index),
+            template_file=template_file,
+            output_template_file=output_template_file,
+        )
+        lines += [f"({package} && {deploy}) &", 'pids="$pids $!"']
+    lines += [*wait_lines, "exit $status"]
+    return "\n".join(lines)
+
+
 if __name__ == "__main__":
     main()
@@ -1,13 +1,14 @@
 from __future__ import annotations
 
-import json
 from datetime import datetime
 from typing import TYPE_CHECKING
 from zoneinfo import ZoneInfo
 
-import boto3
 from pydantic_settings import BaseSettings
 
+from layer_publisher.utils.aws import get_resource
+from layer_publisher.utils.profiler import profile_main, span
+from layer_publisher.utils.serialization import dump_file
 from layer_publisher.utils.variables import FILE_LAYER_INFO
 
 if TYPE_CHECKING:
@@ -21,17 +22,19 @@ class EnvironmentVariables(BaseSettings):
 
 
 jst = ZoneInfo("Asia/Tokyo")
-env = EnvironmentVariables()
-
-table: Table = boto3.resource("dynamodb").Table(env.table_name)
 
 
+@profile_main("start_publish")
 def main():
-    layer = update_state()
-    save_layer(layer=layer)
+    env = EnvironmentVariables()
+    with span("update_state"):
+        layer = update_state(env=env)
+    with span("save_layer"):
+        save_layer(layer=layer)
 
 
-def update_state() -> dict:
+def update_state(*, env: EnvironmentVariables) -> dict:
+    table: Table = get_resource("dynamodb").Table(env.table_name)
     attributes = {
         "stateLayer": "DEPLOYING",
         "updatedAt": datetime.now(jst).isoformat(),
@@ -49,14 +52,12 @@ def update_state() -> dict:
 
 
 def save_layer(*, layer: dict):
-    with open(FILE_LAYER_INFO, "w") as f:
-        json.dump(
-            layer,
-            f,
-            indent=2,
-            ensure_ascii=False,
-            default=lambda x: {"type": str(type(x)), "value": str(x)},
-        )
+    dump_file(
+        FILE_LAYER_INFO,
+        layer,
+        indent=True,
+        default=lambda x: {"type": str(type(x)), "value": str(x)},
+    )
 
 
 if __name__ == "__main__":
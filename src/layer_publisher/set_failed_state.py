@@ -5,9 +5,11 @@ from datetime import datetime
 from typing import TYPE_CHECKING
 from zoneinfo import ZoneInfo
 
-import boto3
 from pydantic_settings import BaseSettings
 
+from layer_publisher.utils.aws import get_client, get_resource
+from layer_publisher.utils.profiler import profile_main, span
+
 if TYPE_CHECKING:
     from mypy_boto3_dynamodb.service_resource import Table
     from mypy_boto3_events import EventBridgeClient
@@ -22,96 +24,117 @@ class EnvironmentVariables(BaseSettings):
 
 
 jst = ZoneInfo("Asia/Tokyo")
-env = EnvironmentVariables()
 all_keys = ["stateLayer", "updatedAt", "actionsPublishUrl"]
 
-table: Table = boto3.resource("dynamodb").Table(env.table_name)
-events: EventBridgeClient = boto3.client("events")
 
-name_attr_url = "actionsPublishUrl" if env.call_on_publish else "actionsGenerateUrl"
+@profile_main("set_failed_state")
+def main():
+    env = EnvironmentVariables()
+    with span("update_state"):
+        resp = update_state(env=env)
+    print(
+        json.dumps(
+            resp,
+            indent=2,
+            ensure_ascii=False,
+            default=lambda x: {"type": str(type(x)), "value": str(x)},
+        )
+    )
+    with span("put_events"):
+        notify(env=env)
 
-if env.call_on_publish:
-    attributes = {
-        "stateLayer": "FAILED",
-        "updatedAt": datetime.now(jst).isoformat(),
-        name_attr_url: env.url_action_run,
-    }
-else:
-    attributes = {
-        "stateGenerate": "FAILED",
-        "updatedAt": datetime.now(jst).isoformat(),
-        name_attr_url: env.url_action_run,
-    }
 
-resp = table.update_item(
-    Key={"identifier": env.identifier},
-    UpdateExpression="set " + ", ".join([f"#{k} = :{k}" for k in attributes.keys()]),
-    ExpressionAttributeNames={f"#{k}": k for k in attributes.keys()},
-    ExpressionAttributeValues={f":{k}": v for k, v in attributes.items()},
-    ReturnValues="ALL_NEW",
-)
-
-print(
-    json.dumps(
-        resp,
-        indent=2,
-        ensure_ascii=False,
-        default=lambda x: {"type": str(type(x)), "value": str(x)},
+def update_state(*, env: EnvironmentVariables) -> dict:
+    table: Table = get_resource("dynamodb").Table(env.table_name)
+    name_attr_url = "actionsPublishUrl" if env.call_on_publish else "actionsGenerateUrl"
+
+    if env.call_on_publish:
+        attributes = {
+            "stateLayer": "FAILED",
+            "updatedAt": datetime.now(jst).isoformat(),
+            name_attr_url: env.url_action_run,
+        }
+    else:
+        attributes = {
+            "stateGenerate": "FAILED",
+            "updatedAt": datetime.now(jst).isoformat(),
+            name_attr_url: env.url_action_run,
+        }
+
+    return table.update_item(
+        Key={"identifier": env.identifier},
+        UpdateExpression="set "
+        + ", ".join([f"#{k} = :{k}" for k in attributes.keys()]),
+        ExpressionAttributeNames={f"#{k}": k for k in attributes.keys()},
+        ExpressionAttributeValues={f":{k}": v for k, v in attributes.items()},
+        ReturnValues="ALL_NEW",
     )
-)
 
-msg_error = "publishing" if env.call_on_publish else "generating"
 
-payload_dict = {
-    "blocks": [
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": f"<!channel> `{datetime.now(tz=jst).isoformat()}`",
+def generate_payload(*, env: EnvironmentVariables) -> dict:
+    msg_error = "publishing" if env.call_on_publish else "generating"
+    return {
+        "blocks": [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"<!channel> `{datetime.now(tz=jst).isoformat()}`",
+                },
             },
-        },
-        {"type": "divider"},
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": f"*System Name:* `public-lambda-layer-publisher`",
+            {"type": "divider"},
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*System Name:* `public-lambda-layer-publisher`",
+                },
             },
-        },
-        {
-            "type": "section",
-            "text": {"type": "mrkdwn", "text": f"*Identifier:* `{env.identifier}`"},
-        },
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": f"*System Name:* `failed in {msg_error}`",
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*Identifier:* `{env.identifier}`",
+                },
             },
-        },
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": f"*Management Page:* <https://management.public-layers.luciferous.app/layer/{env.identifier}|link>",
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*System Name:* `failed in {msg_error}`",
+                },
             },
-        },
-    ]
-}
-
-count = 0
-while count < 3:
-    count += 1
-    resp = events.put_events(
-        Entries=[
             {
-                "Source": "a",
-                "DetailType": "a",
-                "Detail": json.dumps(payload_dict),
-                "EventBusName": env.event_bus_name,
-            }
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*Management Page:* <https://management.public-layers.luciferous.app/layer/{env.identifier}|link>",
+                },
+            },
         ]
-    )
-    if resp["FailedEntryCount"] == 0:
-        count = 999
+    }
+
+
+def notify(*, env: EnvironmentVariables):
+    events: EventBridgeClient = get_client("events")
+    payload_dict = generate_payload(env=env)
+
+    count = 0
+    while count < 3:
+        count += 1
+        resp = events.put_events(
+            Entries=[
+                {
+                    "Source": "a",
+                    "DetailType": "a",
+                    "Detail": json.dumps(payload_dict),
+                    "EventBusName": env.event_bus_name,
+                }
+            ]
+        )
+        if resp["FailedEntryCount"] == 0:
+            count = 999
+
+
+if __name__ == "__main__":
+    main()
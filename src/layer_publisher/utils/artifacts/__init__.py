@@ -0,0 +1 @@
+from .artifacts import SUFFIXES, ArtifactInfo, read_sidecar, write_artifact
@@ -0,0 +1 @@
+from .factory import create_config, get_account_id, get_client, get_resource
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from functools import cache
+from threading import Lock
+from typing import Any
+
+import boto3
+from botocore.config import Config
+
+MAX_POOL_CONNECTIONS = 32
+TOTAL_MAX_ATTEMPTS = 5
+
+# the default boto3 session is not thread safe while creating clients
+_lock = Lock()
+
+
+def create_config(
+    *,
+    max_pool_connections: int = MAX_POOL_CONNECTIONS,
+    total_max_attempts: int = TOTAL_MAX_ATTEMPTS,
+) -> Config:
+    return Config(
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
+        retries={"mode": "standard", "total_max_attempts": total_max_attempts},
+    )
+
+
+@cache
+def get_client(
+    service_name: str,
+    *,
+    region: str | None = None,
+    max_pool_connections: int = MAX_POOL_CONNECTIONS,
+    total_max_attempts: int = TOTAL_MAX_ATTEMPTS,
+) -> Any:
+    # one client per (service, region, config), created on first use
+    config = create_config(
+        max_pool_connections=max_pool_connections,
+        total_max_attempts=total_max_attempts,
+    )
+    with _lock:
+        return boto3.client(service_name, region_name=region, config=config)
+
+
+@cache
+def get_resource(service_name: str, *, region: str | None = None) -> Any:
+    # resources are not thread safe, share them only within one thread
+    with _lock:
+        return boto3.resource(service_name, region_name=region, config=create_config())
+
+
+@cache
+def get_account_id() -> str:
+    return get_client("sts").get_caller_identity()["Account"]
@@ -0,0 +1,8 @@
+from .json_stream import JsonStreamReader, stream_layers_document
+from .layer_records import (
+    FORMAT_JSON,
+    FORMAT_NDJSON,
+    generate_file_name,
+    iter_layer_records,
+    write_layer_records,
+)
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import IO, Any, Iterator
+
+CHUNK_SIZE = 64 * 1024
+
+_whitespace = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+_number_chars = frozenset("0123456789.eE+-")
+
+
+class JsonStreamReader:
+    # decodes one JSON value at a time from a file, keeping only the unread
+    # part of the current chunk in memory
+    def __init__(self, *, f: IO[str], chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.is_eof = False
+
+    def _fill(self) -> bool:
+        if self.is_eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.is_eof = True
+            return False
+        self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.position = _whitespace.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        actual = self.peek()
+        if actual != char:
+            raise ValueError(
+                f"expected {char!r} but got {actual or 'end of file'!r} in JSON stream"
+            )
+        self.position += 1
+
+    def decode(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # a number cut by the chunk boundary ("6." or "6e") decodes to its
+            # prefix, so it is decoded again once the next chunk is appended
+            if (
+                isinstance(value, (int, float))
+                and (end == len(self.buffer) or self.buffer[end] in _number_chars)
+                and self._fill()
+            ):
+                continue
+            self.position = end
+            return value
+
+    def iter_array(self) -> Iterator[Any]:
+        self.expect("[")
+        if self.peek() == "]":
+            self.position += 1
+            return
+        while True:
+            yield self.decode()
+            if self.peek() == ",":
+                self.position += 1
+                continue
+            self.expect("]")
+            return
+
+
+def stream_layers_document(
+    *, f: IO[str], chunk_size: int = CHUNK_SIZE
+) -> Iterator[tuple[str, dict]]:
+    # {"region": ..., "layers": [...]} without loading the whole document,
+    # every layer version is handed over as soon as it is decoded
+    reader = JsonStreamReader(f=f, chunk_size=chunk_size)
+    region: str | None = None
+    pending: list[dict] = []
+
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.position += 1
+        raise ValueError("region is missing in layers document")
+    while True:
+        key = reader.decode()
+        reader.expect(":")
+        if key == "layers":
+            for layer in reader.iter_array():
+                if region is None:
+                    # "layers" before "region" is valid JSON, just not streamed
+                    pending.append(layer)
+                else:
+                    yield region, layer
+        elif key == "region":
+            region = reader.decode()
+            for layer in pending:
+                yield region, layer
+            pending = []
+        else:
+            reader.decode()
+        if reader.peek() == ",":
+            reader.position += 1
+            continue
+        reader.expect("}")
+        break
+
+    if region is None:
+        raise ValueError("region is missing in layers document")
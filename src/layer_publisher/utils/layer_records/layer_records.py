@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from os.path import getsize
+from typing import IO, Iterable, Iterator
+
+from layer_publisher.utils.serialization import dumps, load_file, loads
+
+from .json_stream import stream_layers_document
+
+FORMAT_JSON = "json"
+FORMAT_NDJSON = "ndjson"
+
+KEY_REGION = "Region"
+
+# below this, decoding the whole document at once is faster and small enough
+STREAMING_THRESHOLD = 8 * 1024 * 1024
+
+
+def generate_file_name(*, output_format: str) -> str:
+    if output_format == FORMAT_NDJSON:
+        return "layers.ndjson"
+    if output_format == FORMAT_JSON:
+        return "layers.json"
+    raise ValueError(f"unknown output format: {output_format}")
+
+
+def write_layer_records(*, f: IO[bytes], region: str, records: Iterable[dict]) -> int:
+    # one layer version per line, so readers never hold more than one record
+    count = 0
+    for record in records:
+        f.write(dumps({KEY_REGION: region, **record}))
+        f.write(b"\n")
+        count += 1
+    return count
+
+
+def iter_layer_records(
+    *, path: str, streaming: bool | None = None
+) -> Iterator[tuple[str, dict]]:
+    # (region, layer version) from either layers.json or layers.ndjson.
+    # a large layers.json is decoded one version at a time, so the whole
+    # document is never alive at once; streaming=True/False forces either way
+    if path.endswith(".ndjson"):
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = loads(line)
+                region = record.pop(KEY_REGION)
+                yield region, record
+    elif streaming or (streaming is None and getsize(path) >= STREAMING_THRESHOLD):
+        with open(path, encoding="utf-8") as f:
+            yield from stream_layers_document(f=f)
+    else:
+        data = load_file(path)
+        region = data["region"]
+        for record in data["layers"]:
+            yield region, record
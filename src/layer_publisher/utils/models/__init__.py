@@ -1,3 +1,4 @@
 from .build_config import BuildConfig
 from .layer import Layer
 from .layer_for_generate import LayerForGenerate
+from .layer_record import LayerRecord
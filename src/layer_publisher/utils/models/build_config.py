@@ -1,9 +1,8 @@
 from __future__ import annotations
 
-import json
-
 from pydantic import BaseModel
 
+from layer_publisher.utils.serialization import load_file
 from layer_publisher.utils.variables import FILE_BUILD_CONFIG
 
 
@@ -12,5 +11,4 @@ class BuildConfig(BaseModel):
 
     @staticmethod
     def load() -> BuildConfig:
-        with open(FILE_BUILD_CONFIG) as f:
-            return BuildConfig(**json.load(f))
+        return BuildConfig(**load_file(FILE_BUILD_CONFIG))
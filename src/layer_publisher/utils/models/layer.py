@@ -1,9 +1,8 @@
 from __future__ import annotations
 
-import json
-
 from pydantic import BaseModel
 
+from layer_publisher.utils.serialization import load_file
 from layer_publisher.utils.variables import FILE_LAYER_INFO
 
 
@@ -22,5 +21,9 @@ class Layer(BaseModel):
 
     @staticmethod
     def load() -> Layer:
-        with open(FILE_LAYER_INFO) as f:
-            return Layer(**json.load(f))
+        return Layer(**load_file(FILE_LAYER_INFO))
+
+    @staticmethod
+    def load_batch(path: str) -> list[Layer]:
+        # a JSON array of layer.json entries
+        return [Layer(**x) for x in load_file(path)]
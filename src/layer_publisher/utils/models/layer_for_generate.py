@@ -1,5 +1,21 @@
+from functools import cache
+
 from pydantic import BaseModel
 
+MAPPING_ARCH = {"arm64,x86_64": 0, "x86_64": 1, "arm64": 2}
+
+
+@cache
+def calc_runtime_key(runtime: str) -> int:
+    version = runtime[6:]
+    major, minor = [int(x) for x in version.split(".")]
+    return (major * 1000 + minor) * -1
+
+
+@cache
+def calc_arch_key(architectures: tuple[str, ...]) -> int:
+    return MAPPING_ARCH[",".join(sorted(architectures))]
+
 
 class LayerForGenerate(BaseModel):
     identifier: str
@@ -13,14 +29,10 @@ class LayerForGenerate(BaseModel):
     region: str
 
     def parse_runtime(self) -> int:
-        version = self.runtime[6:]
-        major, minor = [int(x) for x in version.split(".")]
-        return (major * 1000 + minor) * -1
+        return calc_runtime_key(self.runtime)
 
     @property
     def sort_key(self) -> tuple[int, int, str]:
-        mapping_arch = {"arm64,x86_64": 0, "x86_64": 1, "arm64": 2}
-
         version = self.parse_runtime()
-        arch = mapping_arch[",".join(sorted(self.architectures))]
+        arch = calc_arch_key(tuple(self.architectures))
         return self.region, version, arch
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from sys import intern
+
+from .layer_for_generate import LayerForGenerate, calc_arch_key, calc_runtime_key
+
+_architectures: dict[tuple[str, ...], tuple[str, ...]] = {}
+
+
+def intern_architectures(architectures: list[str]) -> tuple[str, ...]:
+    key = tuple(architectures)
+    return _architectures.setdefault(key, tuple(intern(x) for x in key))
+
+
+class LayerRecord:
+    # light weight LayerForGenerate for the aggregation in complete_generate.
+    # no validation, and the strings repeated across every region and
+    # runtime are shared instead of copied per version
+    __slots__ = (
+        "identifier",
+        "hash",
+        "packages",
+        "note",
+        "runtime",
+        "architectures",
+        "layer_version_arn",
+        "created_at",
+        "region",
+        "sort_key",
+    )
+
+    def __init__(
+        self,
+        *,
+        identifier: str,
+        hash: str,
+        packages: str,
+        runtime: str,
+        architectures: list[str],
+        layer_version_arn: str,
+        created_at: str,
+        region: str,
+        note: str | None = None,
+    ):
+        self.identifier = intern(identifier)
+        self.hash = intern(hash)
+        self.packages = packages
+        self.note = note
+        self.runtime = intern(runtime)
+        self.architectures = intern_architectures(architectures)
+        self.layer_version_arn = layer_version_arn
+        self.created_at = created_at
+        self.region = intern(region)
+        # computed once, the aggregation sorts every record by it
+        self.sort_key: tuple[str, int, int] = (
+            self.region,
+            calc_runtime_key(self.runtime),
+            calc_arch_key(self.architectures),
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, LayerRecord):
+            return NotImplemented
+        return all(getattr(self, x) == getattr(other, x) for x in self.__slots__)
+
+    def __repr__(self) -> str:
+        return "LayerRecord({})".format(
+            ", ".join(f"{x}={getattr(self, x)!r}" for x in self.__slots__)
+        )
+
+    def parse_runtime(self) -> int:
+        return calc_runtime_key(self.runtime)
+
+    def to_dict(self) -> dict:
+        # same keys and order as LayerForGenerate.model_dump()
+        return {
+            "identifier": self.identifier,
+            "hash": self.hash,
+            "packages": self.packages,
+            "note": self.note,
+            "runtime": self.runtime,
+            "architectures": list(self.architectures),
+            "layer_version_arn": self.layer_version_arn,
+            "created_at": self.created_at,
+            "region": self.region,
+        }
+
+    def to_model(self) -> LayerForGenerate:
+        return LayerForGenerate(**self.to_dict())
@@ -0,0 +1,8 @@
+from .profiler import (
+    Profiler,
+    ProfileReport,
+    ProfilerSettings,
+    SpanStats,
+    profile_main,
+    span,
+)
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import cProfile
+import resource
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from os import makedirs
+from threading import Lock, local
+from typing import Callable, Iterator, TypeVar
+
+from pydantic import BaseModel
+from pydantic_settings import BaseSettings
+
+from layer_publisher.utils.serialization import dumps
+
+T = TypeVar("T")
+
+
+class ProfilerSettings(BaseSettings):
+    # spans are only recorded when this is set, the report goes there
+    profile_dir: str | None = None
+    # also run cProfile and write <entry point>.prof for snakeviz / pstats
+    profile_cprofile: bool = False
+
+
+class SpanStats(BaseModel):
+    # nested spans are joined with "/", e.g. "save_outputs/dump source_data.json"
+    name: str
+    calls: int = 0
+    wall_seconds: float = 0
+    # of the calling thread, spans on worker threads add up beyond wall time
+    cpu_seconds: float = 0
+
+
+class ProfileReport(BaseModel):
+    entry_point: str
+    wall_seconds: float
+    cpu_seconds: float
+    max_rss_kib: int
+    spans: list[SpanStats]
+    cprofile_path: str | None
+
+
+class Profiler:
+    def __init__(self):
+        self.spans: dict[str, SpanStats] = {}
+        self.lock = Lock()
+        self.stacks = local()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        stack = getattr(self.stacks, "names", None)
+        if stack is None:
+            stack = self.stacks.names = []
+        stack.append(name)
+        path = "/".join(stack)
+        started_at = time.perf_counter()
+        cpu_started_at = time.thread_time()
+        try:
+            yield
+        finally:
+            wall_seconds = time.perf_counter() - started_at
+            cpu_seconds = time.thread_time() - cpu_started_at
+            stack.pop()
+            with self.lock:
+                stats = self.spans.get(path)
+                if stats is None:
+                    stats = self.spans[path] = SpanStats(name=path)
+                stats.calls += 1
+                stats.wall_seconds += wall_seconds
+                stats.cpu_seconds += cpu_seconds
+
+
+_current: Profiler | None = None
+_disabled = nullcontext()
+
+
+def span(name: str):
+    # close to free while no entry point is being profiled
+    if _current is None:
+        return _disabled
+    return _current.span(name)
+
+
+def profile_main(entry_point: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    def decorator(fn: Callable[..., T]) -> Callable[..., T]:
+        @wraps(fn)
+        def wrapper(*args, **kwargs) -> T:
+            global _current
+            settings = ProfilerSettings()
+            if not settings.profile_dir or _current is not None:
+                return fn(*args, **kwargs)
+
+            _current = Profiler()
+            profile = cProfile.Profile() if settings.profile_cprofile else None
+            started_at = time.perf_counter()
+            cpu_started_at = time.process_time()
+            try:
+                if profile is not None:
+                    return profile.runcall(fn, *args, **kwargs)
+                return fn(*args, **kwargs)
+            finally:
+                profiler, _current = _current, None
+                save_report(
+                    profiler=profiler,
+                    profile=profile,
+                    entry_point=entry_point,
+                    dirname=settings.profile_dir,
+                    wall_seconds=time.perf_counter() - started_at,
+                    cpu_seconds=time.process_time() - cpu_started_at,
+                )
+
+        return wrapper
+
+    return decorator
+
+
+def save_report(
+    *,
+    profiler: Profiler,
+    profile: cProfile.Profile | None,
+    entry_point: str,
+    dirname: str,
+    wall_seconds: float,
+    cpu_seconds: float,
+) -> ProfileReport:
+    makedirs(dirname, exist_ok=True)
+    cprofile_path = None
+    if profile is not None:
+        cprofile_path = f"{dirname}/{entry_point}.prof"
+        profile.dump_stats(cprofile_path)
+
+    report = ProfileReport(
+        entry_point=entry_point,
+        wall_seconds=wall_seconds,
+        cpu_seconds=cpu_seconds,
+        max_rss_kib=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        spans=sorted(profiler.spans.values(), key=lambda x: x.name),
+        cprofile_path=cprofile_path,
+    )
+    with open(f"{dirname}/{entry_point}.json", "wb") as f:
+        f.write(dumps(report.model_dump(), indent=True))
+
+    print(
+        f"=== profile: {entry_point} {wall_seconds:.3f}s wall {cpu_seconds:.3f}s cpu ==="
+    )
+    for x in report.spans:
+        print(
+            f"{x.name}: {x.calls} calls, "
+            f"{x.wall_seconds:.3f}s wall, {x.cpu_seconds:.3f}s cpu"
+        )
+    return report
@@ -0,0 +1 @@
+from .adaptive_rate_controller import AdaptiveRateController, RateControllerStats
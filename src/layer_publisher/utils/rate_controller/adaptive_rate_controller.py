@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import random
+import time
+from threading import Condition
+from typing import Callable, TypeVar
+
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+THROTTLE_ERROR_CODES = {
+    "TooManyRequestsException",
+    "ThrottlingException",
+    "Throttling",
+    "RequestLimitExceeded",
+}
+
+
+class RateControllerStats(BaseModel):
+    calls: int = 0
+    throttles: int = 0
+    retries: int = 0
+    concurrency: float = 0
+    peak_concurrency: int = 0
+
+
+class AdaptiveRateController:
+    # AIMD: the concurrency limit grows by one per "window" of successful
+    # calls and is halved on a throttle, so it settles near the API ceiling
+    def __init__(
+        self,
+        *,
+        initial_concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        max_attempts: int = 10,
+        base_delay: float = 0.1,
+        max_delay: float = 10.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max(max_concurrency, min_concurrency)
+        self.limit = float(
+            min(max(initial_concurrency, min_concurrency), self.max_concurrency)
+        )
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+
+        self.in_flight = 0
+        # calls started before the latest decrease must not decrease again
+        self.epoch = 0
+        self.stats = RateControllerStats(concurrency=self.limit)
+        self.condition = Condition()
+
+    def call(self, fn: Callable[..., T], **kwargs) -> T:
+        attempt = 0
+        while True:
+            attempt += 1
+            epoch = self._acquire()
+            try:
+                result = fn(**kwargs)
+            except ClientError as e:
+                is_throttle = e.response["Error"]["Code"] in THROTTLE_ERROR_CODES
+                status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+                if not is_throttle and not (status and status >= 500):
+                    self._release()
+                    raise
+                self._release(throttled_epoch=epoch if is_throttle else None)
+                if attempt >= self.max_attempts:
+                    raise
+            except (ConnectionError, HTTPClientError):
+                # also read timeouts and closed connections, botocore retries
+                # nothing itself (total_max_attempts=1)
+                self._release()
+                if attempt >= self.max_attempts:
+                    raise
+            else:
+                self._release(succeeded=True)
+                return result
+
+            with self.condition:
+                self.stats.retries += 1
+            self.sleep(self._calc_delay(attempt=attempt))
+
+    def _acquire(self) -> int:
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+            self.stats.calls += 1
+            self.stats.peak_concurrency = max(
+                self.stats.peak_concurrency, self.in_flight
+            )
+            return self.epoch
+
+    def _release(self, *, succeeded: bool = False, throttled_epoch: int | None = None):
+        with self.condition:
+            self.in_flight -= 1
+            if succeeded:
+                self.limit = min(self.limit + 1 / self.limit, self.max_concurrency)
+            elif throttled_epoch is not None:
+                self.stats.throttles += 1
+                if throttled_epoch == self.epoch:
+                    self.epoch += 1
+                    self.limit = max(self.limit / 2, self.min_concurrency)
+            self.stats.concurrency = self.limit
+            self.condition.notify_all()
+
+    def _calc_delay(self, *, attempt: int) -> float:
+        # full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
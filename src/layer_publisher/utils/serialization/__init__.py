@@ -0,0 +1,11 @@
+from .json_backend import (
+    BACKEND_JSON,
+    BACKEND_MSGSPEC,
+    BACKEND_ORJSON,
+    JsonBackend,
+    dump_file,
+    dumps,
+    get_backend,
+    load_file,
+    loads,
+)
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+from functools import cache
+from typing import Any, Callable
+
+from pydantic_settings import BaseSettings
+
+BACKEND_ORJSON = "orjson"
+BACKEND_MSGSPEC = "msgspec"
+BACKEND_JSON = "json"
+
+# smaller files are cheaper to read() than to map
+MMAP_THRESHOLD = 1024 * 1024
+
+
+class EnvironmentVariables(BaseSettings):
+    # orjson, msgspec or json. unset picks the fastest one installed
+    json_backend: str | None = None
+    # write every artifact exactly like json.dump(indent=2, ensure_ascii=False)
+    json_compatible: bool = False
+
+
+class JsonBackend:
+    def __init__(self, *, name: str, compatible: bool):
+        self.name = name
+        self.compatible = compatible
+        if name == BACKEND_ORJSON:
+            import orjson
+
+            self._orjson = orjson
+        elif name == BACKEND_MSGSPEC:
+            import msgspec
+
+            self._msgspec = msgspec
+        elif name != BACKEND_JSON:
+            raise ValueError(f"unknown json backend: {name}")
+
+    @property
+    def supports_buffer(self) -> bool:
+        return self.name != BACKEND_JSON
+
+    def loads(self, data: bytes | bytearray | memoryview | str) -> Any:
+        if self.name == BACKEND_ORJSON:
+            return self._orjson.loads(data)
+        if self.name == BACKEND_MSGSPEC:
+            return self._msgspec.json.decode(data)
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    def dumps(
+        self,
+        obj: Any,
+        *,
+        indent: bool = False,
+        default: Callable[[Any], Any] | None = None,
+    ) -> bytes:
+        # msgspec encodes Decimal and set itself instead of calling default,
+        # the DynamoDB items would change shape with the backend installed
+        if (
+            self.name == BACKEND_JSON
+            or self.compatible
+            or (self.name == BACKEND_MSGSPEC and default is not None)
+        ):
+            return json.dumps(
+                obj,
+                indent=2 if indent else None,
+                ensure_ascii=False,
+                default=default,
+                # the same bytes as orjson unless json.dump has to be matched
+                separators=None if self.compatible or indent else (",", ":"),
+            ).encode()
+        if self.name == BACKEND_ORJSON:
+            option = self._orjson.OPT_INDENT_2 if indent else 0
+            return self._orjson.dumps(obj, default=default, option=option)
+        data = self._msgspec.json.encode(obj, enc_hook=default)
+        return self._msgspec.json.format(data, indent=2) if indent else data
+
+
+def detect_backend() -> str:
+    for name in [BACKEND_ORJSON, BACKEND_MSGSPEC]:
+        try:
+            __import__(name)
+        except ImportError:
+            continue
+        return name
+    return BACKEND_JSON
+
+
+@cache
+def get_backend() -> JsonBackend:
+    env = EnvironmentVariables()
+    return JsonBackend(
+        name=env.json_backend or detect_backend(), compatible=env.json_compatible
+    )
+
+
+def loads(data: bytes | bytearray | memoryview | str) -> Any:
+    return get_backend().loads(data)
+
+
+def dumps(
+    obj: Any,
+    *,
+    indent: bool = False,
+    compact: bool = False,
+    default: Callable[[Any], Any] | None = None,
+) -> bytes:
+    # indent is how the artifact has always been written. compact marks
+    # files only read by programs, they drop the indent unless the output
+    # has to stay byte-for-byte compatible
+    backend = get_backend()
+    if compact and not backend.compatible:
+        indent = False
+    return backend.dumps(obj, indent=indent, default=default)
+
+
+def load_file(path: str) -> Any:
+    backend = get_backend()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not backend.supports_buffer or size < MMAP_THRESHOLD:
+            return backend.loads(f.read())
+        # the parser reads the page cache directly, no copy of the file
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                return backend.loads(view)
+
+
+def dump_file(
+    path: str,
+    obj: Any,
+    *,
+    indent: bool = False,
+    compact: bool = False,
+    default: Callable[[Any], Any] | None = None,
+):
+    with open(path, "wb") as f:
+        f.write(dumps(obj, indent=indent, compact=compact, default=default))
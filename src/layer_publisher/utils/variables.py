@@ -2,3 +2,48 @@ FILE_LAYER_INFO = "layer.json"
 FILE_BUILD_CONFIG = "build_config.json"
 FILE_INSTALL_SCRIPT = "install_script.sh"
 FILE_SOURCE_DATA = "source_data.json"
+DIR_SOURCE_DATA_SHARDS = "source_data"
+FILE_SOURCE_DATA_MANIFEST = "manifest.json"
+# under DIR_SOURCE_DATA_SHARDS, apart from the manifest
+DIR_SHARDS = "shards"
+# the shards whose sha256 differs from the uploaded manifest, and the
+# files of identifiers which are gone
+DIR_SOURCE_DATA_UPLOAD = "source_data_upload"
+FILE_SOURCE_DATA_REMOVED = "source_data_removed.txt"
+FILE_SOURCE_INDEX = "source_index.json"
+FILE_SOURCE_DATA_DELTA = "source_data_delta.json"
+DIR_SOURCE_DATA_DELTAS = "source_data_deltas"
+FILE_FETCH_STATE = "fetch_state.json"
+
+REGIONS = [
+    "af-south-1",
+    "ap-south-2",
+    "ap-southeast-3",
+    "ap-southeast-4",
+    "ap-southeast-5",
+    "ap-southeast-7",
+    "ca-west-1",
+    "eu-central-2",
+    "eu-south-1",
+    "eu-south-2",
+    "il-central-1",
+    "me-central-1",
+    "mx-central-1",
+    "ap-northeast-1",
+    "ap-northeast-2",
+    "ap-northeast-3",
+    "ap-south-1",
+    "ap-southeast-1",
+    "ap-southeast-2",
+    "ca-central-1",
+    "eu-central-1",
+    "eu-north-1",
+    "eu-west-1",
+    "eu-west-2",
+    "eu-west-3",
+    "sa-east-1",
+    "us-east-1",
+    "us-east-2",
+    "us-west-1",
+    "us-west-2",
+]
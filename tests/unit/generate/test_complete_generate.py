@@ -0,0 +1,675 @@
+import hashlib
+import json
+import random
+import shutil
+import sqlite3
+
+import pytest
+from humps import pascalize
+
+import layer_publisher.generate.complete_generate as index
+from benchmarks.reference import classify_layers, fix_layers_for_identifier
+from layer_publisher.utils.layer_records import write_layer_records
+from layer_publisher.utils.models import LayerForGenerate, LayerRecord
+
+
+def create_raw_layer(
+    *,
+    identifier: str,
+    hash: str,
+    runtime: str,
+    region: str,
+    version: int,
+    created_at: str,
+    architectures: list[str] | None = None,
+) -> dict:
+    name = "LuciferousPublicLayer{identifier}{runtime}".format(
+        identifier=pascalize(identifier),
+        runtime=pascalize(runtime).replace(".", ""),
+    )
+    return {
+        "LayerVersionArn": f"arn:aws:lambda:{region}:123456789012:layer:{name}:{version}",
+        "Version": version,
+        "Description": f"identifier=== {identifier}\nhash=== {hash}\npackages=== {identifier}\n",
+        "CreatedDate": created_at,
+        "CompatibleRuntimes": [runtime],
+        "CompatibleArchitectures": architectures or ["arm64", "x86_64"],
+    }
+
+
+def create_region_files(*, base_dir, identifiers: list[str]) -> list[str]:
+    paths = []
+    for region in ["ap-northeast-1", "us-east-1"]:
+        layers = []
+        for identifier in identifiers:
+            for runtime in ["python3.12", "python3.13"]:
+                for version, hash in enumerate(["old", "new"], start=1):
+                    layers.append(
+                        create_raw_layer(
+                            identifier=identifier,
+                            hash=f"{identifier}-{hash}",
+                            runtime=runtime,
+                            region=region,
+                            version=version,
+                            created_at=f"2025-05-0{version}T00:00:00.000+0000",
+                        )
+                    )
+        path = base_dir / "layers" / region / "layers.json"
+        path.parent.mkdir(parents=True)
+        path.write_text(json.dumps({"region": region, "layers": layers}))
+        paths.append(str(path))
+    return paths
+
+
+def create_fixed(*, identifier: str) -> index.FixedClassifiedLayers:
+    layer = LayerForGenerate(
+        identifier=identifier,
+        hash="1223334444",
+        packages=identifier,
+        runtime="python3.13",
+        architectures=["arm64", "x86_64"],
+        layer_version_arn=f"{identifier}:1",
+        created_at="1223334444",
+        region="us-east-1",
+    )
+    return index.FixedClassifiedLayers(
+        identifier=identifier, latest_layers=[layer], all_layers=[layer]
+    )
+
+
+def load_layers(*, all_files: list[str], identifier: str | None = None):
+    all_layers, _ = index.aggregate_files(all_files=all_files, identifier=identifier)
+    return all_layers
+
+
+class TestLoadLayers:
+    def test_identifier(self, tmp_path):
+        all_files = create_region_files(
+            base_dir=tmp_path, identifiers=["zstd", "zstd-extra", "web-scraper"]
+        )
+        actual = load_layers(all_files=all_files, identifier="zstd")
+        assert len(actual) == 8
+        assert {x.identifier for x in actual} == {"zstd"}
+
+
+class TestSpliceSourceData:
+    @pytest.mark.parametrize(
+        "option, expected",
+        [
+            (
+                {
+                    "previous": index.SourceData(
+                        layers=[
+                            create_fixed(identifier="a"),
+                            create_fixed(identifier="b"),
+                        ]
+                    ),
+                    "identifier": "a",
+                    "fixed": create_fixed(identifier="a"),
+                },
+                ["a", "b"],
+            ),
+            (
+                {
+                    "previous": index.SourceData(layers=[create_fixed(identifier="a")]),
+                    "identifier": "b",
+                    "fixed": create_fixed(identifier="b"),
+                },
+                ["a", "b"],
+            ),
+            (
+                {
+                    "previous": index.SourceData(
+                        layers=[
+                            create_fixed(identifier="a"),
+                            create_fixed(identifier="b"),
+                        ]
+                    ),
+                    "identifier": "a",
+                    "fixed": None,
+                },
+                ["b"],
+            ),
+        ],
+    )
+    def test_normal(self, option, expected):
+        actual = index.splice_source_data(**option)
+        assert [x.identifier for x in actual.layers] == expected
+
+
+class TestAggregateLayersForIdentifier:
+    def test_normal(self, tmp_path, monkeypatch):
+        identifiers = ["zstd", "zstd-extra", "web-scraper"]
+        create_region_files(base_dir=tmp_path, identifiers=identifiers)
+        monkeypatch.chdir(tmp_path)
+
+        index.aggregate_layers()
+        with open(index.FILE_SOURCE_DATA) as f:
+            expected = json.load(f)
+        expected_all_layers = (tmp_path / "all_layers.json").read_text()
+
+        # the bucket holds a stale entry for zstd
+        stale = index.SourceData(**expected)
+        stale.layers[0] = create_fixed(identifier="zstd")
+        layers_data_dir = tmp_path / "bucket"
+        layers_data_dir.mkdir()
+        (layers_data_dir / index.FILE_SOURCE_DATA).write_text(stale.model_dump_json())
+
+        monkeypatch.setenv("TABLE_NAME", "layers")
+        monkeypatch.setenv("IDENTIFIER", "zstd")
+        monkeypatch.setenv("BUCKET_NAME_LAYERS_DATA", "unused")
+        monkeypatch.setenv("LAYERS_DATA_DIR", str(layers_data_dir))
+        index.aggregate_layers_for_identifier(env=index.EnvironmentVariables())
+        with open(index.FILE_SOURCE_DATA) as f:
+            actual = json.load(f)
+
+        assert actual == expected
+        # the catalog wide file is not replaced by one identifier
+        assert (tmp_path / "all_layers.json").read_text() == expected_all_layers
+
+    def test_missing_previous(self, tmp_path, monkeypatch):
+        create_region_files(base_dir=tmp_path, identifiers=["zstd", "web-scraper"])
+        monkeypatch.chdir(tmp_path)
+        layers_data_dir = tmp_path / "bucket"
+        layers_data_dir.mkdir()
+
+        monkeypatch.setenv("TABLE_NAME", "layers")
+        monkeypatch.setenv("IDENTIFIER", "zstd")
+        monkeypatch.setenv("BUCKET_NAME_LAYERS_DATA", "unused")
+        monkeypatch.setenv("LAYERS_DATA_DIR", str(layers_data_dir))
+        with pytest.raises(ValueError):
+            index.aggregate_layers_for_identifier(env=index.EnvironmentVariables())
+        assert not (tmp_path / index.FILE_SOURCE_DATA).exists()
+
+
+class TestLoadLayersNdjson:
+    def test_normal(self, tmp_path):
+        all_files = create_region_files(
+            base_dir=tmp_path, identifiers=["zstd", "web-scraper"]
+        )
+        expected = load_layers(all_files=all_files)
+
+        ndjson_files = []
+        for path in all_files:
+            with open(path) as f:
+                data = json.load(f)
+            ndjson_path = path.replace(".json", ".ndjson")
+            with open(ndjson_path, "wb") as f:
+                write_layer_records(f=f, region=data["region"], records=data["layers"])
+            ndjson_files.append(ndjson_path)
+
+        actual = load_layers(all_files=ndjson_files)
+        assert actual == expected
+
+
+def create_random_records(*, seed: int, count: int) -> list[LayerRecord]:
+    rand = random.Random(seed)
+    return [
+        LayerRecord(
+            identifier=rand.choice(["zstd", "web-scraper", "pydantic"]),
+            hash=rand.choice(["h1", "h2", "h3", "h4"]),
+            packages="packages",
+            runtime=rand.choice(["python3.9", "python3.12", "python3.13"]),
+            architectures=rand.choice([["arm64", "x86_64"], ["x86_64"], ["arm64"]]),
+            layer_version_arn=f"arn:{i}",
+            # few distinct values, so ties and overwritten newest records happen
+            created_at=f"2025-05-0{rand.randint(1, 4)}",
+            region=rand.choice(["ap-northeast-1", "us-east-1"]),
+        )
+        for i in range(count)
+    ]
+
+
+class TestLayerAggregator:
+    @pytest.mark.parametrize("seed", range(20))
+    def test_normal(self, seed):
+        records = create_random_records(seed=seed, count=200)
+        mapping_layers = classify_layers(all_layers=records)
+        expected = index.SourceData(
+            layers=[
+                fix_layers_for_identifier(identifier=k, mapping_hash=v)
+                for k, v in mapping_layers.items()
+            ]
+        )
+
+        aggregator = index.LayerAggregator()
+        for record in records:
+            aggregator.add(record)
+        actual = aggregator.to_source_data()
+
+        assert actual.model_dump() == expected.model_dump()
+
+
+class TestLoadAndAggregate:
+    @pytest.mark.parametrize("identifier", [None, "zstd"])
+    def test_normal(self, tmp_path, identifier):
+        all_files = create_region_files(
+            base_dir=tmp_path, identifiers=["zstd", "zstd-extra", "web-scraper"]
+        )
+        expected_layers, expected = index.load_and_aggregate(
+            all_files=all_files, identifier=identifier, workers=1
+        )
+        actual_layers, actual = index.load_and_aggregate(
+            all_files=all_files, identifier=identifier, workers=2
+        )
+
+        assert actual_layers == expected_layers
+        assert actual.to_source_data() == expected.to_source_data()
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_cache_counts(self, tmp_path, workers):
+        all_files = create_region_files(
+            base_dir=tmp_path, identifiers=["zstd", "zstd-extra", "web-scraper"]
+        )
+        cache_counts = {}
+        all_layers, _ = index.load_and_aggregate(
+            all_files=all_files, workers=workers, cache_counts=cache_counts
+        )
+
+        # worker processes report their own caches
+        actual = index.calc_description_cache_stats(counts=cache_counts)
+        assert actual["hits"] + actual["misses"] == len(all_layers)
+        assert actual["hits"] > 0
+        assert 1 <= actual["processes"] <= workers
+
+
+class TestParseDescription:
+    @pytest.mark.parametrize(
+        "description, expected",
+        [
+            (
+                "identifier=== zstd\nhash=== 1223334444\npackages=== zstd==1.5.7.0\n",
+                {
+                    "identifier": "zstd",
+                    "hash": "1223334444",
+                    "packages": "zstd==1.5.7.0",
+                },
+            ),
+            (
+                "identifier=== zstd\nhash=== 1223334444\npackages=== zstd\nnote=== test data\n",
+                {
+                    "identifier": "zstd",
+                    "hash": "1223334444",
+                    "packages": "zstd",
+                    "note": "test data",
+                },
+            ),
+        ],
+    )
+    def test_normal(self, description, expected):
+        actual = index.parse_description(description)
+        assert actual == expected
+
+    def test_cache(self):
+        index.parse_description.cache_clear()
+        before = index.parse_description.cache_info()
+        description = "identifier=== zstd\nhash=== 1223334444\npackages=== zstd\n"
+        first = index.parse_description(description)
+        for _ in range(3):
+            assert index.parse_description(description) is first
+
+        actual = index.calc_description_cache_stats(
+            counts=index.count_description_cache(before=before)
+        )
+        assert (actual["hits"], actual["misses"], actual["size"]) == (3, 1, 1)
+        assert actual["hit_rate"] == 0.75
+        with pytest.raises(TypeError):
+            first["identifier"] = "other"
+
+
+class TestSaveShards:
+    def test_normal(self, tmp_path):
+        dirname = tmp_path / "source_data"
+        (dirname / "shards").mkdir(parents=True)
+        (dirname / "shards" / "removed.json").write_text("{}")
+        (dirname / "shards" / "removed.json.gz").write_text("")
+        source_data = index.SourceData(
+            layers=[
+                create_fixed(identifier="zstd"),
+                create_fixed(identifier="a"),
+                create_fixed(identifier="manifest"),
+                create_fixed(identifier="a/b"),
+            ]
+        )
+
+        actual = index.save_shards(source_data=source_data, dirname=str(dirname))
+
+        assert list(actual.identifiers.keys()) == ["zstd", "a", "manifest", "a/b"]
+        assert [x.file for x in actual.identifiers.values()] == [
+            "shards/zstd.json",
+            "shards/a.json",
+            "shards/manifest.json",
+            "shards/a%2Fb.json",
+        ]
+        assert sorted(x.name for x in dirname.glob("*.json")) == ["manifest.json"]
+        assert not list(dirname.glob("shards/removed.*"))
+        entry = actual.identifiers["zstd"]
+        data = (dirname / entry.file).read_bytes()
+        assert entry.sha256 == hashlib.sha256(data).hexdigest()
+        assert (entry.latest_hash, entry.latest_layers, entry.all_layers) == (
+            "1223334444",
+            1,
+            1,
+        )
+        assert index.FixedClassifiedLayers(**json.loads(data)) == source_data.layers[0]
+        manifest = json.loads((dirname / "manifest.json").read_text())
+        assert index.SourceDataManifest(**manifest) == actual
+
+
+def create_manifest(**files: str) -> index.SourceDataManifest:
+    return index.SourceDataManifest(
+        identifiers={
+            k: index.ShardEntry(
+                file=f"shards/{k}.json",
+                sha256=v,
+                latest_hash=None,
+                latest_layers=0,
+                all_layers=0,
+            )
+            for k, v in files.items()
+        }
+    )
+
+
+class TestPlanShardUpload:
+    @pytest.mark.parametrize(
+        "option, expected",
+        [
+            (
+                {"previous": None, "manifest": create_manifest(a="1", b="2")},
+                (["shards/a.json", "shards/b.json"], []),
+            ),
+            (
+                {
+                    "previous": create_manifest(a="1", b="2", c="3"),
+                    "manifest": create_manifest(a="1", b="20", d="4"),
+                },
+                (["shards/b.json", "shards/d.json"], ["shards/c.json"]),
+            ),
+            (
+                {
+                    "previous": create_manifest(a="1"),
+                    "manifest": create_manifest(a="1"),
+                },
+                ([], []),
+            ),
+        ],
+    )
+    def test_normal(self, option, expected):
+        actual = index.plan_shard_upload(**option)
+        assert actual == expected
+
+
+class TestSaveShardUpload:
+    def test_normal(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        source_data = index.SourceData(
+            layers=[create_fixed(identifier="a"), create_fixed(identifier="b")]
+        )
+        previous = index.save_shards(source_data=source_data, dirname="source_data")
+        previous.identifiers["gone"] = previous.identifiers["a"].model_copy(
+            update={"file": "shards/gone.json"}
+        )
+        changed = create_fixed(identifier="b")
+        changed.latest_layers = []
+        manifest = index.save_shards(
+            source_data=index.SourceData(
+                layers=[create_fixed(identifier="a"), changed]
+            ),
+            dirname="source_data",
+        )
+        # a stale upload of an earlier run is replaced
+        (tmp_path / "source_data_upload" / "shards").mkdir(parents=True)
+        (tmp_path / "source_data_upload" / "shards" / "a.json").write_text("{}")
+
+        index.save_shard_upload(
+            previous=previous,
+            manifest=manifest,
+            dirname="source_data",
+            upload_dirname="source_data_upload",
+        )
+
+        upload_dir = tmp_path / "source_data_upload"
+        assert sorted(
+            str(x.relative_to(upload_dir)) for x in upload_dir.rglob("*.json")
+        ) == ["manifest.json", "shards/b.json"]
+        assert (upload_dir / "shards" / "b.json.gz").exists()
+        assert (upload_dir / "shards" / "b.json").read_bytes() == (
+            tmp_path / "source_data" / "shards" / "b.json"
+        ).read_bytes()
+        removed = (tmp_path / index.FILE_SOURCE_DATA_REMOVED).read_text().split()
+        assert removed[0] == "shards/gone.json"
+        assert "shards/gone.json.gz" in removed
+
+
+class TestParsePackageNames:
+    @pytest.mark.parametrize(
+        "packages, expected",
+        [
+            ("zstd", ["zstd"]),
+            ("zstd==1.5.7.0", ["zstd"]),
+            ("pandas[excel]>=2.0, Typing_Extensions", ["pandas", "typing-extensions"]),
+            (
+                "ruamel.yaml~=0.18, aws-lambda-powertools",
+                ["ruamel-yaml", "aws-lambda-powertools"],
+            ),
+            ("", []),
+        ],
+    )
+    def test_normal(self, packages, expected):
+        actual = index.parse_package_names(packages=packages)
+        assert actual == expected
+
+
+class TestBuildSourceIndex:
+    def test_normal(self, tmp_path):
+        all_files = create_region_files(base_dir=tmp_path, identifiers=["zstd", "a"])
+        _, aggregator = index.load_and_aggregate(all_files=all_files)
+        source_data = aggregator.to_source_data()
+        # a combination which only the old hash of "a" has
+        old = (
+            source_data.layers[1]
+            .all_layers[-1]
+            .model_copy(
+                update={"runtime": "python3.11", "layer_version_arn": "a-old-311"}
+            )
+        )
+        source_data.layers[1].all_layers.append(old)
+
+        actual = index.build_source_index(source_data=source_data)
+
+        assert actual.identifiers == ["zstd", "a"]
+        assert actual.packages == {"a": [1], "zstd": [0]}
+        assert actual.runtimes == {
+            "python3.11": [1],
+            "python3.12": [0, 1],
+            "python3.13": [0, 1],
+        }
+        # same answer as scanning all_layers, newest hash first
+        for fixed in source_data.layers:
+            for layer in fixed.all_layers:
+                key = index.generate_facet_key(layer=layer)
+                refs = dict(actual.latest[key])
+                identifier_ref = actual.identifiers.index(fixed.identifier)
+                expected = next(
+                    x.layer_version_arn
+                    for x in fixed.all_layers
+                    if index.generate_facet_key(layer=x) == key
+                )
+                assert actual.layers[refs[identifier_ref]] == expected
+        assert (
+            actual.layers[dict(actual.latest["us-east-1|python3.11|arm64,x86_64"])[1]]
+            == "a-old-311"
+        )
+        assert len(actual.latest) == 5
+        assert len(actual.layers) == 9
+        # round trip through json keeps the integer references
+        assert index.SourceIndex(**json.loads(actual.model_dump_json())) == actual
+
+
+class TestSaveSqlite:
+    def test_normal(self, tmp_path):
+        all_files = create_region_files(base_dir=tmp_path, identifiers=["zstd", "a"])
+        _, aggregator = index.load_and_aggregate(all_files=all_files)
+        source_data = aggregator.to_source_data()
+        path = tmp_path / "catalog.sqlite"
+        path.write_bytes(b"stale")
+
+        index.save_sqlite(source_data=source_data, path=str(path))
+
+        connection = sqlite3.connect(path)
+        connection.row_factory = sqlite3.Row
+        columns = list(LayerForGenerate.model_fields.keys())
+
+        def to_model(row: sqlite3.Row) -> LayerForGenerate:
+            data = {x: row[x] for x in columns}
+            data["architectures"] = row["architectures"].split(",")
+            return LayerForGenerate(**data)
+
+        identifiers = connection.execute(
+            "SELECT identifier, latest_hash FROM identifiers ORDER BY position"
+        ).fetchall()
+        assert [tuple(x) for x in identifiers] == [
+            ("zstd", "zstd-new"),
+            ("a", "a-new"),
+        ]
+        for fixed in source_data.layers:
+            all_layers = connection.execute(
+                "SELECT * FROM layers WHERE identifier = ? ORDER BY position",
+                (fixed.identifier,),
+            ).fetchall()
+            assert [to_model(x) for x in all_layers] == fixed.all_layers
+            latest_layers = connection.execute(
+                "SELECT * FROM latest_layers WHERE identifier = ? ORDER BY position",
+                (fixed.identifier,),
+            ).fetchall()
+            assert [to_model(x) for x in latest_layers] == fixed.latest_layers
+        indexes = {
+            x[0]
+            for x in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+        }
+        assert {"layers_hash", "layers_region", "layers_created_at"} <= indexes
+        connection.close()
+        assert not (tmp_path / "catalog.sqlite.tmp").exists()
+
+
+class TestDiffSourceData:
+    def test_normal(self):
+        a = create_fixed(identifier="a")
+        b = create_fixed(identifier="b")
+        added = b.all_layers[0].model_copy(
+            update={"hash": "new", "layer_version_arn": "b:2"}
+        )
+        new_b = index.FixedClassifiedLayers(
+            identifier="b", latest_layers=[added], all_layers=[added, *b.all_layers]
+        )
+        c = create_fixed(identifier="c")
+        previous = index.SourceData(layers=[a, b, create_fixed(identifier="d")])
+        current = index.SourceData(layers=[c, a, new_b])
+
+        actual = index.diff_source_data(previous=previous, current=current)
+
+        assert [(x.identifier, x.added, x.removed) for x in actual] == [
+            ("c", ["c:1"], []),
+            ("b", ["b:2"], []),
+            ("d", [], ["d:1"]),
+        ]
+        assert actual[0].latest_layers == c.latest_layers
+        assert actual[1].latest_layers == [added]
+        assert actual[2].latest_layers == []
+
+    def test_unchanged(self):
+        previous = index.SourceData(layers=[create_fixed(identifier="a")])
+        actual = index.diff_source_data(previous=previous, current=previous)
+        assert actual == []
+
+
+class TestSaveDelta:
+    @staticmethod
+    def generate(*, tmp_path, current: index.SourceData):
+        # one run against the bucket, source_data.json is written first
+        index.write_artifact(index.FILE_SOURCE_DATA, current.model_dump_json().encode())
+        return index.save_delta(
+            previous=index.load_previous_source_data(
+                layers_data_dir=str(tmp_path / "bucket"), bucket_name="unused"
+            ),
+            source_data=current,
+            previous_delta=index.load_previous_delta(
+                layers_data_dir=str(tmp_path / "bucket"), bucket_name="unused"
+            ),
+        )
+
+    @staticmethod
+    def upload(*, tmp_path, names: list[str]):
+        for name in names:
+            shutil.copyfile(tmp_path / name, tmp_path / "bucket" / name)
+
+    def test_normal(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "bucket").mkdir()
+        empty = index.SourceData(layers=[])
+        source_data = index.SourceData(layers=[create_fixed(identifier="a")])
+        names = [index.FILE_SOURCE_DATA_DELTA, index.FILE_SOURCE_DATA]
+
+        first = self.generate(tmp_path=tmp_path, current=source_data)
+        assert (first.sequence, first.base_sha256) == (1, None)
+        assert first.sha256 == index.read_sidecar(index.FILE_SOURCE_DATA)
+        self.upload(tmp_path=tmp_path, names=names)
+
+        # nothing changed, no new sequence
+        assert self.generate(tmp_path=tmp_path, current=source_data) is None
+
+        second = self.generate(tmp_path=tmp_path, current=empty)
+        assert (second.sequence, second.base_sha256) == (2, first.sha256)
+        assert [x.removed for x in second.identifiers] == [["a:1"]]
+        self.upload(tmp_path=tmp_path, names=names)
+
+        with open(index.FILE_SOURCE_DATA_DELTA) as f:
+            assert index.SourceDataDelta(**json.load(f)) == second
+        assert sorted(
+            x.name for x in (tmp_path / "source_data_deltas").glob("*.json")
+        ) == [
+            "1.json",
+            "2.json",
+        ]
+        actual = index.load_previous_delta(
+            layers_data_dir=str(tmp_path / "bucket"), bucket_name="unused"
+        )
+        assert actual == second
+
+    def test_mismatched(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "bucket").mkdir()
+        a = index.SourceData(layers=[create_fixed(identifier="a")])
+        b = index.SourceData(layers=[create_fixed(identifier="b")])
+
+        first = self.generate(tmp_path=tmp_path, current=a)
+        self.upload(
+            tmp_path=tmp_path,
+            names=[index.FILE_SOURCE_DATA_DELTA, index.FILE_SOURCE_DATA],
+        )
+        # source_data.json went up, the delta of the run did not
+        self.generate(tmp_path=tmp_path, current=b)
+        self.upload(tmp_path=tmp_path, names=[index.FILE_SOURCE_DATA])
+
+        actual = self.generate(tmp_path=tmp_path, current=a)
+        uploaded = (tmp_path / "bucket" / index.FILE_SOURCE_DATA).read_bytes()
+        assert actual.base_sha256 == hashlib.sha256(uploaded).hexdigest()
+        assert actual.base_sha256 != first.sha256
+        assert actual.sequence == 2
+        # diffed against b, what the bucket holds
+        assert [(x.identifier, x.added, x.removed) for x in actual.identifiers] == [
+            ("a", ["a:1"], []),
+            ("b", [], ["b:1"]),
+        ]
+
+    def test_previous_source_data(self, tmp_path):
+        data = b'{"layers": []}'
+        (tmp_path / index.FILE_SOURCE_DATA).write_bytes(data)
+        actual = index.load_previous_source_data(
+            layers_data_dir=str(tmp_path), bucket_name="unused"
+        )
+        assert actual.source_data == index.SourceData(layers=[])
+        assert actual.sha256 == hashlib.sha256(data).hexdigest()
@@ -0,0 +1,212 @@
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+import layer_publisher.generate.fetch_layers as index
+
+
+class FakeClient:
+    def __init__(self, *, pages: dict[str, list[list[dict]]]):
+        self.pages = pages
+
+    def list_layer_versions(self, *, LayerName: str, Marker: str | None = None):
+        # shuffle completion order between threads
+        time.sleep(random.random() / 1000)
+        pages = self.pages[LayerName]
+        page = int(Marker or 0)
+        resp = {"LayerVersions": pages[page]}
+        if page + 1 < len(pages):
+            resp["NextMarker"] = str(page + 1)
+        return resp
+
+
+def create_pages(*, layer_names: list[str]) -> dict[str, list[list[dict]]]:
+    return {
+        name: [
+            [{"LayerVersionArn": f"{name}:{page * 2 + x}"} for x in range(2)]
+            for page in range(3)
+        ]
+        for name in layer_names
+    }
+
+
+class TestListLayerVersions:
+    @pytest.mark.parametrize("max_workers", [0, 1, 4, 16])
+    def test_normal(self, max_workers):
+        layer_names = [f"Layer{i}" for i in range(20)]
+        client = FakeClient(pages=create_pages(layer_names=layer_names))
+        expected = [
+            {"LayerVersionArn": f"{name}:{x}"} for name in layer_names for x in range(6)
+        ]
+
+        actual = index.list_layer_versions(
+            client=client, all_layer_names=layer_names, max_workers=max_workers
+        )
+        assert actual == expected
+
+
+class TestResolveRegions:
+    @pytest.mark.parametrize(
+        "option, expected",
+        [
+            (
+                {"fetch_regions": None, "default_region": "ap-northeast-1"},
+                ["ap-northeast-1"],
+            ),
+            (
+                {"fetch_regions": "us-east-1, eu-west-1", "default_region": None},
+                ["us-east-1", "eu-west-1"],
+            ),
+            (
+                {"fetch_regions": "us-east-1,", "default_region": "ap-northeast-1"},
+                ["us-east-1"],
+            ),
+            (
+                {"fetch_regions": "all", "default_region": "ap-northeast-1"},
+                index.REGIONS,
+            ),
+        ],
+    )
+    def test_normal(self, option, expected):
+        actual = index.resolve_regions(**option)
+        assert actual == expected
+
+    def test_error(self):
+        with pytest.raises(ValueError):
+            index.resolve_regions(fetch_regions=None, default_region=None)
+
+
+def create_version(*, name: str, version: int) -> dict:
+    return {
+        "LayerVersionArn": f"arn:aws:lambda:us-east-1:123456789012:layer:{name}:{version}",
+        "Version": version,
+    }
+
+
+def create_layer(*, name: str, version: int) -> dict:
+    return {
+        "LayerName": name,
+        "LatestMatchingVersion": create_version(name=name, version=version),
+    }
+
+
+class TestFindUnchangedLayers:
+    @pytest.mark.parametrize(
+        "option, expected",
+        [
+            (
+                {
+                    "all_layers": [
+                        create_layer(name="A", version=2),
+                        create_layer(name="B", version=3),
+                        create_layer(name="C", version=1),
+                    ],
+                    "previous": {
+                        "A": [
+                            create_version(name="A", version=2),
+                            create_version(name="A", version=1),
+                        ],
+                        "B": [create_version(name="B", version=2)],
+                    },
+                },
+                {
+                    "A": [
+                        create_version(name="A", version=2),
+                        create_version(name="A", version=1),
+                    ]
+                },
+            ),
+            (
+                {"all_layers": [create_layer(name="A", version=2)], "previous": {}},
+                {},
+            ),
+        ],
+    )
+    def test_normal(self, option, expected):
+        actual = index.find_unchanged_layers(**option)
+        assert actual == expected
+
+
+class TestListLayerVersionsWithCarried:
+    def test_normal(self):
+        layer_names = ["Layer0", "Layer1", "Layer2"]
+        pages = create_pages(layer_names=layer_names)
+        carried = {"Layer1": [{"LayerVersionArn": "Layer1:carried"}]}
+        # the carried layer must not be listed again
+        del pages["Layer1"]
+        client = FakeClient(pages=pages)
+
+        actual = index.list_layer_versions(
+            client=client, all_layer_names=layer_names, max_workers=2, carried=carried
+        )
+        assert actual == (
+            [{"LayerVersionArn": f"Layer0:{x}"} for x in range(6)]
+            + [{"LayerVersionArn": "Layer1:carried"}]
+            + [{"LayerVersionArn": f"Layer2:{x}"} for x in range(6)]
+        )
+
+
+class TestLoadPreviousVersions:
+    def test_normal(self, tmp_path):
+        path = tmp_path / "layers.json"
+        path.write_text(
+            json.dumps(
+                {
+                    "region": "us-east-1",
+                    "layers": [
+                        create_version(name="A", version=2),
+                        create_version(name="A", version=1),
+                        create_version(name="B", version=1),
+                    ],
+                }
+            )
+        )
+        actual = index.load_previous_versions(path=str(path))
+        assert actual == {
+            "A": [
+                create_version(name="A", version=2),
+                create_version(name="A", version=1),
+            ],
+            "B": [create_version(name="B", version=1)],
+        }
+
+    def test_missing(self, tmp_path):
+        actual = index.load_previous_versions(path=str(tmp_path / "layers.json"))
+        assert actual == {}
+
+
+class TestResolvePreviousDir:
+    @pytest.mark.parametrize(
+        "full_fetched_at, expected_dir, expected_at",
+        [
+            # within the interval, the snapshot and its state are kept
+            ("2024-01-05T00:00:00+00:00", True, "2024-01-05T00:00:00+00:00"),
+            # too old, a full fetch starts a new interval
+            ("2024-01-01T00:00:00+00:00", False, "2024-01-08T00:00:00+00:00"),
+            # no state, the snapshot is not trusted
+            (None, False, "2024-01-08T00:00:00+00:00"),
+        ],
+    )
+    def test_normal(self, tmp_path, full_fetched_at, expected_dir, expected_at):
+        if full_fetched_at:
+            (tmp_path / "fetch_state.json").write_text(
+                json.dumps({"full_fetched_at": full_fetched_at})
+            )
+        env = index.EnvironmentVariables(
+            fetch_previous_dir=str(tmp_path), fetch_full_interval_hours=168
+        )
+        previous_dir, state = index.resolve_previous_dir(
+            env=env, now=datetime(2024, 1, 8, tzinfo=timezone.utc)
+        )
+        assert previous_dir == (str(tmp_path) if expected_dir else None)
+        assert state.full_fetched_at == expected_at
+
+    def test_unset(self):
+        previous_dir, _ = index.resolve_previous_dir(
+            env=index.EnvironmentVariables(fetch_previous_dir=None),
+            now=datetime(2024, 1, 8, tzinfo=timezone.utc),
+        )
+        assert previous_dir is None
@@ -0,0 +1,118 @@
+import json
+
+import pytest
+from humps import pascalize
+
+import layer_publisher.generate.complete_generate as complete_generate
+import layer_publisher.generate.fetch_layers as fetch_layers
+import layer_publisher.generate.pipeline as index
+import layer_publisher.generate.start_generate as start_generate
+
+REGIONS = ["us-east-1", "ap-northeast-1"]
+
+
+class FakeClient:
+    def __init__(self, *, region: str):
+        self.versions = {}
+        for identifier in ["zstd", "zstd-extra"]:
+            for runtime in ["python3.12", "python3.13"]:
+                name = "LuciferousPublicLayer{}{}".format(
+                    pascalize(identifier), pascalize(runtime).replace(".", "")
+                )
+                self.versions[name] = [
+                    {
+                        "LayerVersionArn": f"arn:aws:lambda:{region}:123456789012:layer:{name}:{version}",
+                        "Version": version,
+                        "Description": f"identifier=== {identifier}\nhash=== {identifier}-{version}\npackages=== {identifier}\n",
+                        "CreatedDate": f"2025-05-0{version}T00:00:00.000+0000",
+                        "CompatibleRuntimes": [runtime],
+                        "CompatibleArchitectures": ["arm64", "x86_64"],
+                    }
+                    for version in [2, 1]
+                ]
+
+    def list_layers(self):
+        return {
+            "Layers": [
+                {"LayerName": k, "LatestMatchingVersion": v[0]}
+                for k, v in self.versions.items()
+            ]
+        }
+
+    def list_layer_versions(self, *, LayerName: str):
+        return {"LayerVersions": self.versions[LayerName]}
+
+
+def client_factory(*, region: str, max_pool_connections: int) -> FakeClient:
+    return FakeClient(region=region)
+
+
+@pytest.fixture
+def environment(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "bucket").mkdir()
+    for k, v in {
+        "TABLE_NAME": "layers",
+        "IDENTIFIER": "zstd",
+        "URL_ACTION_RUN": "https://example.com",
+        "BUCKET_NAME_LAYERS_DATA": "unused",
+        "LAYERS_DATA_DIR": str(tmp_path / "bucket"),
+        "FETCH_REGIONS": ",".join(REGIONS),
+    }.items():
+        monkeypatch.setenv(k, v)
+    monkeypatch.setattr(
+        start_generate, "update_state", lambda *, env: {"identifier": env.identifier}
+    )
+    monkeypatch.setattr(complete_generate, "update_state", lambda *, env: None)
+    return tmp_path
+
+
+class TestParseStages:
+    @pytest.mark.parametrize(
+        "pipeline_stages, expected",
+        [
+            ("complete_generate, fetch_layers", ["fetch_layers", "complete_generate"]),
+            (",".join(index.STAGES), index.STAGES),
+        ],
+    )
+    def test_normal(self, pipeline_stages, expected):
+        actual = index.parse_stages(pipeline_stages=pipeline_stages)
+        assert actual == expected
+
+    def test_error(self):
+        with pytest.raises(ValueError):
+            index.parse_stages(pipeline_stages="fetch_layers,deploy")
+
+
+class TestRun:
+    def test_normal(self, environment):
+        # the separate steps, handing over files
+        for region in REGIONS:
+            fetch_layers.fetch_region(
+                region=region, concurrency=2, client_factory=client_factory
+            )
+        (environment / "dist").rename(environment / "tmp")
+        (environment / "tmp" / "layers").rename(environment / "layers")
+        complete_generate.main()
+        expected = (environment / complete_generate.FILE_SOURCE_DATA).read_text()
+        expected_all_layers = (environment / "all_layers.json").read_text()
+
+        timings = index.run(stages=index.STAGES, client_factory=client_factory)
+
+        assert [x.name for x in timings] == index.STAGES
+        assert (
+            environment / complete_generate.FILE_SOURCE_DATA
+        ).read_text() == expected
+        assert (environment / "all_layers.json").read_text() == expected_all_layers
+        assert not (environment / "dist").exists()
+        assert not (environment / "layer.json").exists()
+
+    def test_write_files(self, environment):
+        index.run(stages=index.STAGES, write_files=True, client_factory=client_factory)
+
+        assert json.loads((environment / "layer.json").read_text()) == {
+            "identifier": "zstd"
+        }
+        for region in REGIONS:
+            path = environment / "dist" / "layers" / region / "layers.json"
+            assert json.loads(path.read_text())["region"] == region
@@ -1,3 +1,6 @@
+import os
+import subprocess
+
 import pytest
 
 import layer_publisher.publish.publish.before_publish as index
@@ -934,9 +937,30 @@ class TestGenerateTemplate:
         ],
     )
     def test_normal(self, option, expected):
-        actual = index.generate_template(**option)
+        actual = index.generate_template(targets=[index.TemplateTarget(**option)])
         assert actual.split("\n") == expected
 
+    def test_batch(self):
+        targets = [
+            index.TemplateTarget(
+                desc_data=index.DescriptionData(
+                    identifier=x, hash="1223334444", packages=x
+                ),
+                all_architectures=[index.Architecture.NONE],
+                target_runtimes=["python3.13"],
+            )
+            for x in ["zstd", "ruamel.yaml"]
+        ]
+        single = index.generate_template(targets=targets[:1]).split("\n")
+        actual = index.generate_template(targets=targets, is_batch=True).split("\n")
+
+        assert "  LayerPython313:" in single
+        assert "      ContentUri: modules/amd/python3.13" in single
+        assert "  LayerZstdPython313:" in actual
+        assert "  PermissionRuamelYamlPython313:" in actual
+        assert "      ContentUri: modules/zstd/amd/python3.13" in actual
+        assert "      ContentUri: modules/ruamel.yaml/amd/python3.13" in actual
+
 
 class TestGenerateScript:
     @pytest.mark.parametrize(
@@ -964,3 +988,306 @@ class TestGenerateScript:
     def test_normal(self, option, expected):
         actual = index.generate_script(**option)
         assert actual.split("\n") == expected
+
+
+class TestGenerateLogicalNamePrefix:
+    @pytest.mark.parametrize(
+        "option, expected",
+        [
+            ({"identifier": "zstd"}, "Zstd"),
+            ({"identifier": "aws-cloudwatch-logs-url"}, "AwsCloudwatchLogsUrl"),
+            ({"identifier": "ruamel.yaml"}, "RuamelYaml"),
+        ],
+    )
+    def test_normal(self, option, expected):
+        actual = index.generate_logical_name_prefix(**option)
+        assert actual == expected
+
+
+class TestPartitionTemplatesContent:
+    @staticmethod
+    def create_target(*, identifier: str) -> index.TemplateTarget:
+        return index.TemplateTarget(
+            desc_data=index.DescriptionData(
+                identifier=identifier, hash="1223334444", packages=identifier
+            ),
+            all_architectures=[index.Architecture.AMD, index.Architecture.ARM],
+            target_runtimes=["python3.13", "python3.12"],
+        )
+
+    def test_normal(self):
+        partitions = index.partition_templates(
+            targets=[
+                self.create_target(identifier="zstd"),
+                self.create_target(identifier="aws-cloudwatch-logs-url"),
+            ]
+        )
+        assert len(partitions) == 1
+        actual = partitions[0].template.split("\n")
+
+        assert actual[:2] == ["Transform: AWS::Serverless-2016-10-31", "Resources:"]
+        logical_names = [
+            x.strip().rstrip(":")
+            for x in actual
+            if x.startswith("  ") and not x.startswith("   ")
+        ]
+        assert len(logical_names) == len(set(logical_names)) == 16
+        assert logical_names[:4] == [
+            "LayerZstdPython313Amd",
+            "PermissionZstdPython313Amd",
+            "LayerZstdPython312Amd",
+            "PermissionZstdPython312Amd",
+        ]
+        assert "LayerAwsCloudwatchLogsUrlPython312Arm" in logical_names
+        assert "      ContentUri: modules/zstd/arm/python3.13" in actual
+        assert (
+            "      ContentUri: modules/aws-cloudwatch-logs-url/amd/python3.12" in actual
+        )
+        assert "      LayerVersionArn: !Ref LayerZstdPython313Arm" in actual
+        # the physical layer names are the same as in a single stack
+        assert "      LayerName: LuciferousPublicLayerZstdPython313Amd" in actual
+
+    def test_duplicated_logical_names(self):
+        with pytest.raises(ValueError):
+            index.partition_templates(
+                targets=[
+                    self.create_target(identifier="ruamel-yaml"),
+                    self.create_target(identifier="ruamel.yaml"),
+                ]
+            )
+
+
+class TestGenerateBatchStackName:
+    @pytest.mark.parametrize(
+        "option, expected",
+        [
+            ({"name": "nightly", "index": 0}, "LayerBatchNightlyPart0"),
+            ({"name": "2024-01", "index": 3}, "LayerBatch202401Part3"),
+        ],
+    )
+    def test_normal(self, option, expected):
+        actual = index.generate_batch_stack_name(**option)
+        assert actual == expected
+
+
+class TestCalcPartitionScore:
+    def test_normal(self):
+        actual = [
+            index.calc_partition_score(identifier="zstd", index=x) for x in range(4)
+        ]
+        assert actual == [
+            index.calc_partition_score(identifier="zstd", index=x) for x in range(4)
+        ]
+        assert len(set(actual)) == 4
+        assert actual[0] != index.calc_partition_score(identifier="numpy", index=0)
+
+
+class TestPartitionTemplates:
+    @staticmethod
+    def create_targets(*, count: int) -> list[index.TemplateTarget]:
+        # 2 archs x 5 runtimes x 2 resources = 20 resources each
+        return [
+            index.TemplateTarget(
+                desc_data=index.DescriptionData(
+                    identifier=f"package-{i}", hash="1223334444", packages=f"p{i}"
+                ),
+                all_architectures=[index.Architecture.AMD, index.Architecture.ARM],
+                target_runtimes=[f"python3.{x}" for x in range(9, 14)],
+            )
+            for i in range(count)
+        ]
+
+    def test_single(self):
+        targets = self.create_targets(count=5)
+        actual = index.partition_templates(targets=targets)
+        assert len(actual) == 1
+        assert (actual[0].index, actual[0].partitions) == (0, 1)
+        assert actual[0].identifiers == [x.desc_data.identifier for x in targets]
+        assert actual[0].template.count("Type: AWS::") == 5 * 20
+
+    @pytest.mark.parametrize("max_resources", [100, 200, 400])
+    def test_budget(self, max_resources):
+        targets = self.create_targets(count=60)
+        actual = index.partition_templates(targets=targets, max_resources=max_resources)
+        assert len({x.partitions for x in actual}) == 1
+        assert actual[0].partitions >= 1200 // max_resources
+        assert sorted(y for x in actual for y in x.identifiers) == sorted(
+            x.desc_data.identifier for x in targets
+        )
+        for x in actual:
+            assert x.template.count("Type: AWS::") <= max_resources
+
+    def test_stable(self):
+        targets = self.create_targets(count=60)
+        actual = index.partition_templates(
+            targets=targets, min_partitions=8, max_resources=200
+        )
+        before = {y: x.index for x in actual for y in x.identifiers}
+        # the order of the batch file does not matter
+        reordered = index.partition_templates(
+            targets=targets[::-1], min_partitions=8, max_resources=200
+        )
+        assert {y: x.index for x in reordered for y in x.identifiers} == before
+        # new identifiers do not move the existing ones while there is room
+        grown = index.partition_templates(
+            targets=self.create_targets(count=62), min_partitions=8, max_resources=200
+        )
+        assert grown[0].partitions == 8
+        after = {y: x.index for x in grown for y in x.identifiers}
+        assert all(after[k] == v for k, v in before.items())
+
+    @pytest.mark.parametrize("partitions", [1, 4, 7])
+    def test_grown_partitions(self, partitions):
+        # with room everywhere, one more partition only takes identifiers
+        targets = self.create_targets(count=60)
+        before = {
+            y: x.index
+            for x in index.partition_templates(
+                targets=targets, min_partitions=partitions, max_resources=10_000
+            )
+            for y in x.identifiers
+        }
+        after = {
+            y: x.index
+            for x in index.partition_templates(
+                targets=targets, min_partitions=partitions + 1, max_resources=10_000
+            )
+            for y in x.identifiers
+        }
+        moved = [k for k, v in before.items() if after[k] != v]
+        assert moved
+        assert all(after[k] == partitions for k in moved)
+
+    def test_near_budget(self):
+        # every identifier needs a stack of its own
+        targets = self.create_targets(count=30)
+        actual = index.partition_templates(targets=targets, max_resources=20)
+        assert actual[0].partitions == 30
+        assert all(len(x.identifiers) == 1 for x in actual)
+
+    def test_max_bytes(self):
+        targets = self.create_targets(count=10)
+        actual = index.partition_templates(targets=targets, max_bytes=20_000)
+        assert actual[0].partitions > 1
+        assert all(len(x.template.encode()) <= 20_000 for x in actual)
+
+    def test_too_large(self):
+        with pytest.raises(ValueError):
+            index.partition_templates(
+                targets=self.create_targets(count=2), max_resources=10
+            )
+
+
+class TestGenerateScriptBatch:
+    @staticmethod
+    def create_partition(*, index_: int, partitions: int) -> index.TemplatePartition:
+        return index.TemplatePartition(
+            index=index_, partitions=partitions, identifiers=["zstd"], template=""
+        )
+
+    @staticmethod
+    def create_job(*, index_: int) -> str:
+        return (
+            f"(aws cloudformation package --s3-bucket test-s3-bucket --template-file sam_{index_}.yml --output-template-file template_{index_}.yml"
+            f" && sam deploy --stack-name LayerBatchNightlyPart{index_} --template-file template_{index_}.yml --role-arn $CLOUDFORMATION_ROLE_ARN) &"
+        )
+
+    def test_single(self):
+        actual = index.generate_script(
+            bucket_name="test-s3-bucket",
+            batch_name="nightly",
+            partitions=[self.create_partition(index_=0, partitions=1)],
+        )
+        assert actual.split("\n") == [
+            "status=0",
+            'pids=""',
+            "(aws cloudformation package --s3-bucket test-s3-bucket --template-file sam_0.yml --output-template-file template_0.yml && sam deploy --stack-name LayerBatchNightlyPart0 --template-file template_0.yml --role-arn $CLOUDFORMATION_ROLE_ARN) &",
+            'pids="$pids $!"',
+            'for pid in $pids; do wait "$pid" || status=1; done',
+            'pids=""',
+            "exit $status",
+        ]
+
+    def test_concurrent(self):
+        actual = index.generate_script(
+            bucket_name="test-s3-bucket",
+            batch_name="nightly",
+            partitions=[
+                self.create_partition(index_=0, partitions=3),
+                self.create_partition(index_=2, partitions=3),
+            ],
+        )
+        assert actual.split("\n") == [
+            "status=0",
+            'pids=""',
+            self.create_job(index_=0),
+            'pids="$pids $!"',
+            self.create_job(index_=2),
+            'pids="$pids $!"',
+            'for pid in $pids; do wait "$pid" || status=1; done',
+            'pids=""',
+            "exit $status",
+        ]
+
+    @pytest.mark.parametrize(
+        "concurrency, expected",
+        [
+            (1, [[0], [1], [2], [3], [4]]),
+            (2, [[0, 1], [2, 3], [4]]),
+            (5, [[0, 1, 2, 3, 4]]),
+            (8, [[0, 1, 2, 3, 4]]),
+        ],
+    )
+    def test_waves(self, concurrency, expected):
+        actual = index.generate_script(
+            bucket_name="test-s3-bucket",
+            batch_name="nightly",
+            partitions=[
+                self.create_partition(index_=x, partitions=5) for x in range(5)
+            ],
+            concurrency=concurrency,
+        )
+        # the jobs started between two waits
+        waves = [[]]
+        for line in actual.split("\n"):
+            if line.startswith("for pid in $pids"):
+                waves.append([])
+            for x in range(5):
+                if line == self.create_job(index_=x):
+                    waves[-1].append(x)
+        assert waves[:-1] == expected
+        assert waves[-1] == []
+
+    def test_script_runs(self, tmp_path):
+        # the waits really bound the number of jobs, and one failure fails all
+        script = index.generate_script(
+            bucket_name="test-s3-bucket",
+            batch_name="nightly",
+            partitions=[
+                self.create_partition(index_=x, partitions=5) for x in range(5)
+            ],
+            concurrency=2,
+        )
+        fake = tmp_path / "bin"
+        fake.mkdir()
+        (fake / "aws").write_text(
+            '#!/bin/sh\necho "$$ start" >> "$LOG"\nsleep 0.2\necho "$$ end" >> "$LOG"\n'
+        )
+        (fake / "sam").write_text(
+            '#!/bin/sh\ncase "$3" in *Part3) exit 1;; esac\nexit 0\n'
+        )
+        for x in fake.iterdir():
+            x.chmod(0o755)
+        (tmp_path / "deploy.sh").write_text(script)
+        log = tmp_path / "log"
+        result = subprocess.run(
+            ["sh", "deploy.sh"],
+            cwd=tmp_path,
+            env={**os.environ, "PATH": f"{fake}:{os.environ['PATH']}", "LOG": str(log)},
+        )
+        assert result.returncode == 1
+        running = peak = 0
+        for line in log.read_text().splitlines():
+            running += 1 if line.endswith("start") else -1
+            peak = max(peak, running)
+        assert peak == 2
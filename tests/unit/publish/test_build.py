@@ -110,6 +110,27 @@ class TestGenerateLines:
         actual = index.generate_lines(**option)
         assert actual == expected
 
+    def test_batch(self):
+        actual = index.generate_lines(
+            layer=Layer(
+                identifier="zstd",
+                packages=["zstd==1.5.6.1"],
+                ignoreVersions=None,
+                isArchitectureSplit=False,
+                note=None,
+            ),
+            all_runtimes=["python3.13"],
+            is_batch=True,
+        )
+        assert actual == {
+            "amd": [
+                "./build.sh --packages zstd==1.5.6.1 --arch amd --runtime python3.13 --identifier zstd"
+            ],
+            "arm": [
+                "./build.sh --packages zstd==1.5.6.1 --arch arm --runtime python3.13 --identifier zstd"
+            ],
+        }
+
 
 class TestFilterLines:
     @pytest.mark.parametrize(
@@ -0,0 +1,45 @@
+import subprocess
+import sys
+import types
+from importlib import import_module
+
+import pytest
+
+import layer_publisher.__main__ as index
+
+
+class TestMain:
+    def test_normal(self, monkeypatch):
+        calls = []
+        module = types.ModuleType("fake_command")
+        module.main = lambda: calls.append("called")
+        monkeypatch.setitem(sys.modules, "fake_command", module)
+        monkeypatch.setitem(index.COMMANDS, "fake", ("fake_command", "fake"))
+
+        index.main(["fake"])
+        assert calls == ["called"]
+
+    def test_unknown(self):
+        with pytest.raises(SystemExit):
+            index.main(["unknown"])
+
+    @pytest.mark.parametrize("command", list(index.COMMANDS))
+    def test_commands(self, command):
+        # importing a command module must not read env vars or call AWS
+        module_name, _ = index.COMMANDS[command]
+        assert callable(import_module(module_name).main)
+
+    def test_lazy(self):
+        code = (
+            "import sys, layer_publisher.__main__ as m;"
+            "m.create_parser();"
+            "print(sorted(x for x in ['boto3', 'pydantic'] if x in sys.modules))"
+        )
+        proc = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+            env={"PYTHONPATH": ":".join(sys.path)},
+        )
+        assert proc.stdout.strip() == "[]"
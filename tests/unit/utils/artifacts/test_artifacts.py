@@ -0,0 +1,64 @@
+import gzip
+import hashlib
+
+import zstandard
+
+import layer_publisher.utils.artifacts.artifacts as index
+
+DATA = b'{"layers": []}' * 100
+
+
+class TestWriteArtifact:
+    def test_normal(self, tmp_path):
+        path = str(tmp_path / "source_data.json")
+
+        actual = index.write_artifact(path, DATA)
+
+        digest = hashlib.sha256(DATA).hexdigest()
+        assert (actual.sha256, actual.size, actual.changed) == (digest, len(DATA), True)
+        assert (tmp_path / "source_data.json").read_bytes() == DATA
+        assert gzip.decompress((tmp_path / "source_data.json.gz").read_bytes()) == DATA
+        assert (tmp_path / "source_data.json.sha256").read_text() == (
+            f"{digest}  source_data.json\n"
+        )
+        assert index.read_sidecar(path) == digest
+        assert actual.variants[f"{path}.gz"] < len(DATA)
+
+    def test_zstd(self, tmp_path):
+        path = str(tmp_path / "source_data.json")
+
+        actual = index.write_artifact(path, DATA)
+
+        data = (tmp_path / "source_data.json.zst").read_bytes()
+        assert zstandard.ZstdDecompressor().decompress(data) == DATA
+        assert f"{path}.zst" in actual.variants
+
+    def test_unchanged(self, tmp_path):
+        path = str(tmp_path / "source_data.json")
+        first = index.write_artifact(path, DATA)
+        gz = tmp_path / "source_data.json.gz"
+        mtime = gz.stat().st_mtime_ns
+
+        actual = index.write_artifact(path, DATA)
+
+        assert actual.changed is False
+        assert actual.variants == first.variants
+        assert gz.stat().st_mtime_ns == mtime
+
+    def test_changed(self, tmp_path):
+        path = str(tmp_path / "source_data.json")
+        index.write_artifact(path, DATA)
+
+        actual = index.write_artifact(path, DATA + b" ")
+
+        assert actual.changed is True
+        assert gzip.decompress((tmp_path / "source_data.json.gz").read_bytes()) == (
+            DATA + b" "
+        )
+
+    def test_deterministic(self, tmp_path):
+        index.write_artifact(str(tmp_path / "a.json"), DATA)
+        index.write_artifact(str(tmp_path / "b.json"), DATA)
+        assert (tmp_path / "a.json.gz").read_bytes() == (
+            tmp_path / "b.json.gz"
+        ).read_bytes()
@@ -0,0 +1,29 @@
+import pytest
+
+from layer_publisher.utils.aws import create_config, get_client
+
+
+class TestCreateConfig:
+    @pytest.mark.parametrize(
+        "option, expected",
+        [
+            ({}, (32, {"mode": "standard", "total_max_attempts": 5})),
+            (
+                {"max_pool_connections": 8, "total_max_attempts": 1},
+                (8, {"mode": "standard", "total_max_attempts": 1}),
+            ),
+        ],
+    )
+    def test_normal(self, option, expected):
+        actual = create_config(**option)
+        assert (actual.max_pool_connections, actual.retries) == expected
+        assert actual.tcp_keepalive is True
+
+
+class TestGetClient:
+    def test_cache(self):
+        client = get_client("lambda", region="us-east-1")
+        assert get_client("lambda", region="us-east-1") is client
+        assert get_client("lambda", region="us-west-2") is not client
+        assert client.meta.region_name == "us-east-1"
+        assert client.meta.config.max_pool_connections == 32
@@ -0,0 +1,68 @@
+import io
+import json
+
+import pytest
+
+import layer_publisher.utils.layer_records as index
+
+LAYERS = [
+    {
+        "LayerVersionArn": "arn:aws:lambda:us-east-1:123456789012:layer:A:12345",
+        "Version": 12345,
+        "Description": 'identifier=== あいう\nhash=== {"x": [1, 2]}\n',
+        "CompatibleArchitectures": ["arm64", "x86_64"],
+        "Size": 1.5e3,
+        "Flag": True,
+        "Empty": None,
+    },
+    {"LayerVersionArn": "arn:2", "Version": 2, "Nested": {"a": [[], {}]}},
+]
+
+
+def create_documents() -> list[str]:
+    return [
+        json.dumps({"region": "us-east-1", "layers": LAYERS}, ensure_ascii=False),
+        json.dumps({"region": "us-east-1", "layers": LAYERS}, indent=2),
+        json.dumps({"layers": LAYERS, "region": "us-east-1"}),
+        json.dumps({"region": "us-east-1", "extra": [1, {"a": 2}], "layers": LAYERS}),
+    ]
+
+
+class TestStreamLayersDocument:
+    @pytest.mark.parametrize("document", create_documents())
+    @pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, 65536])
+    def test_normal(self, document, chunk_size):
+        actual = list(
+            index.stream_layers_document(f=io.StringIO(document), chunk_size=chunk_size)
+        )
+        assert actual == [("us-east-1", x) for x in LAYERS]
+
+    @pytest.mark.parametrize("chunk_size", [1, 5])
+    def test_empty_layers(self, chunk_size):
+        document = '{"region": "us-east-1", "layers": [ ]}'
+        actual = list(
+            index.stream_layers_document(f=io.StringIO(document), chunk_size=chunk_size)
+        )
+        assert actual == []
+
+    @pytest.mark.parametrize(
+        "document",
+        [
+            '{"layers": []}',
+            '{"region": "us-east-1", "layers": [{"a": 1}',
+            '{"region": "us-east-1", "layers": [{"a": 1} {"b": 2}]}',
+            "[]",
+        ],
+    )
+    def test_error(self, document):
+        with pytest.raises(ValueError):
+            list(index.stream_layers_document(f=io.StringIO(document), chunk_size=4))
+
+
+class TestJsonStreamReader:
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3])
+    def test_number_at_chunk_boundary(self, chunk_size):
+        reader = index.JsonStreamReader(
+            f=io.StringIO("[12345, 6.25e2, -7]"), chunk_size=chunk_size
+        )
+        assert list(reader.iter_array()) == [12345, 625.0, -7]
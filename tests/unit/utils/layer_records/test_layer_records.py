@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+import layer_publisher.utils.layer_records as index
+
+RECORDS = [
+    {"LayerVersionArn": "arn:1", "Version": 1, "Description": "identifier=== あ\n"},
+    {"LayerVersionArn": "arn:2", "Version": 2, "Description": "identifier=== b\n"},
+]
+
+
+class TestGenerateFileName:
+    @pytest.mark.parametrize(
+        "output_format, expected",
+        [(index.FORMAT_JSON, "layers.json"), (index.FORMAT_NDJSON, "layers.ndjson")],
+    )
+    def test_normal(self, output_format, expected):
+        actual = index.generate_file_name(output_format=output_format)
+        assert actual == expected
+
+    def test_error(self):
+        with pytest.raises(ValueError):
+            index.generate_file_name(output_format="csv")
+
+
+class TestIterLayerRecords:
+    def test_ndjson(self, tmp_path):
+        path = tmp_path / "layers.ndjson"
+        with open(path, "wb") as f:
+            count = index.write_layer_records(
+                f=f, region="us-east-1", records=iter(RECORDS)
+            )
+        assert count == 2
+        assert len(path.read_text().splitlines()) == 2
+
+        actual = list(index.iter_layer_records(path=str(path)))
+        assert actual == [("us-east-1", x) for x in RECORDS]
+
+    @pytest.mark.parametrize("streaming", [None, True, False])
+    def test_json(self, tmp_path, streaming):
+        path = tmp_path / "layers.json"
+        path.write_text(json.dumps({"region": "us-east-1", "layers": RECORDS}))
+
+        actual = list(index.iter_layer_records(path=str(path), streaming=streaming))
+        assert actual == [("us-east-1", x) for x in RECORDS]
@@ -0,0 +1,55 @@
+import pytest
+
+from layer_publisher.utils.models import LayerForGenerate, LayerRecord
+
+
+def create_option(*, runtime: str, architectures: list[str], note: str | None) -> dict:
+    return {
+        "identifier": "zstd",
+        "hash": "1223334444",
+        "packages": "zstd",
+        "note": note,
+        "runtime": runtime,
+        "architectures": architectures,
+        "layer_version_arn": f"{runtime}:{','.join(architectures)}",
+        "created_at": "1223334444",
+        "region": "ap-northeast-1",
+    }
+
+
+OPTIONS = [
+    create_option(runtime="python3.13", architectures=["arm64", "x86_64"], note=None),
+    create_option(runtime="python3.9", architectures=["x86_64"], note="test data"),
+    create_option(runtime="python3.10", architectures=["arm64"], note=None),
+]
+
+
+class TestToDict:
+    @pytest.mark.parametrize("option", OPTIONS)
+    def test_normal(self, option):
+        actual = LayerRecord(**option).to_dict()
+        expected = LayerForGenerate(**option).model_dump()
+        assert actual == expected
+        assert list(actual.keys()) == list(expected.keys())
+
+
+class TestToModel:
+    @pytest.mark.parametrize("option", OPTIONS)
+    def test_normal(self, option):
+        actual = LayerRecord(**option).to_model()
+        assert actual == LayerForGenerate(**option)
+
+
+class TestSortKey:
+    @pytest.mark.parametrize("option", OPTIONS)
+    def test_normal(self, option):
+        actual = LayerRecord(**option).sort_key
+        assert actual == LayerForGenerate(**option).sort_key
+
+
+class TestIntern:
+    def test_normal(self):
+        a = LayerRecord(**OPTIONS[0])
+        b = LayerRecord(**{**OPTIONS[0], "region": "".join(["ap-", "northeast-1"])})
+        assert a.region is b.region
+        assert a.architectures is b.architectures
@@ -0,0 +1,55 @@
+import json
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import layer_publisher.utils.profiler as index
+
+
+@index.profile_main("sample")
+def sample_main(*, count: int) -> int:
+    with index.span("outer"):
+        with index.span("inner"):
+            pass
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(lambda _: run_span(), range(count)))
+    return count
+
+
+def run_span():
+    with index.span("worker"):
+        pass
+
+
+class TestProfileMain:
+    def test_disabled(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("PROFILE_DIR", raising=False)
+        monkeypatch.chdir(tmp_path)
+
+        assert sample_main(count=3) == 3
+        assert list(tmp_path.iterdir()) == []
+
+    @pytest.mark.parametrize("cprofile", [False, True])
+    def test_normal(self, tmp_path, monkeypatch, cprofile):
+        monkeypatch.setenv("PROFILE_DIR", str(tmp_path / "profile"))
+        monkeypatch.setenv("PROFILE_CPROFILE", str(cprofile).lower())
+
+        assert sample_main(count=3) == 3
+
+        with open(tmp_path / "profile" / "sample.json") as f:
+            report = index.ProfileReport(**json.load(f))
+        assert report.entry_point == "sample"
+        assert {x.name: x.calls for x in report.spans} == {
+            "outer": 1,
+            "outer/inner": 1,
+            "worker": 3,
+        }
+        assert all(x.wall_seconds >= 0 for x in report.spans)
+        prof_path = tmp_path / "profile" / "sample.prof"
+        assert prof_path.exists() == cprofile
+        if cprofile:
+            assert report.cprofile_path == str(prof_path)
+            assert pstats.Stats(str(prof_path)).total_calls > 0
+        # spans are dropped once main() returned
+        assert index.span("after") is index.span("after")
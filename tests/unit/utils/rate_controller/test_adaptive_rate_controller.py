@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
+from layer_publisher.utils.rate_controller import AdaptiveRateController
+
+
+def create_error(*, code: str, status: int) -> ClientError:
+    return ClientError(
+        {
+            "Error": {"Code": code, "Message": code},
+            "ResponseMetadata": {"HTTPStatusCode": status},
+        },
+        "ListLayerVersions",
+    )
+
+
+class FlakyOperation:
+    def __init__(self, *, errors: list[Exception]):
+        self.errors = list(errors)
+        self.count = 0
+
+    def __call__(self, **kwargs):
+        self.count += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return kwargs
+
+
+class TestCall:
+    def test_retry_throttle(self):
+        controller = AdaptiveRateController(
+            initial_concurrency=8, max_concurrency=8, sleep=lambda x: None
+        )
+        operation = FlakyOperation(
+            errors=[
+                create_error(code="TooManyRequestsException", status=429),
+                create_error(code="ServiceException", status=500),
+            ]
+        )
+
+        actual = controller.call(operation, LayerName="a")
+        assert actual == {"LayerName": "a"}
+        assert operation.count == 3
+        assert controller.stats.calls == 3
+        assert controller.stats.throttles == 1
+        assert controller.stats.retries == 2
+        # halved by the throttle, then grown by one success
+        assert controller.limit == pytest.approx(4 + 1 / 4)
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            ReadTimeoutError(endpoint_url="https://lambda"),
+            ConnectionClosedError(endpoint_url="https://lambda"),
+            EndpointConnectionError(endpoint_url="https://lambda"),
+        ],
+    )
+    def test_retry_connection(self, error):
+        controller = AdaptiveRateController(
+            initial_concurrency=4, max_concurrency=8, sleep=lambda x: None
+        )
+        operation = FlakyOperation(errors=[error, error])
+
+        actual = controller.call(operation, LayerName="a")
+        assert actual == {"LayerName": "a"}
+        assert operation.count == 3
+        assert controller.stats.retries == 2
+        # not a throttle, the limit is left alone
+        assert controller.stats.throttles == 0
+        assert controller.in_flight == 0
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            create_error(code="ResourceNotFoundException", status=404),
+            create_error(code="AccessDeniedException", status=403),
+        ],
+    )
+    def test_not_retryable(self, error):
+        controller = AdaptiveRateController(sleep=lambda x: None)
+        operation = FlakyOperation(errors=[error])
+
+        with pytest.raises(ClientError):
+            controller.call(operation)
+        assert operation.count == 1
+        assert controller.in_flight == 0
+
+    def test_give_up(self):
+        controller = AdaptiveRateController(max_attempts=3, sleep=lambda x: None)
+        operation = FlakyOperation(
+            errors=[create_error(code="TooManyRequestsException", status=429)] * 5
+        )
+
+        with pytest.raises(ClientError):
+            controller.call(operation)
+        assert operation.count == 3
+        assert controller.stats.throttles == 3
+        assert controller.limit == 1
+
+    def test_limit_concurrency(self):
+        controller = AdaptiveRateController(initial_concurrency=3, max_concurrency=3)
+        lock = threading.Lock()
+        state = {"current": 0, "peak": 0}
+
+        def operation():
+            with lock:
+                state["current"] += 1
+                state["peak"] = max(state["peak"], state["current"])
+            time.sleep(0.005)
+            with lock:
+                state["current"] -= 1
+
+        threads = [
+            threading.Thread(target=controller.call, args=(operation,))
+            for _ in range(12)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert state["peak"] <= 3
+        assert controller.stats.peak_concurrency <= 3
+        assert controller.stats.calls == 12
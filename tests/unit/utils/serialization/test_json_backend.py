@@ -0,0 +1,96 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+import layer_publisher.utils.serialization.json_backend as index
+
+DATA = {
+    "layers": [
+        {"identifier": "あいう", "note": None, "architectures": ["arm64", "x86_64"]},
+        {"identifier": "zstd", "version": 3, "empty": [], "nested": {}},
+    ]
+}
+
+BACKENDS = [index.BACKEND_JSON, index.BACKEND_ORJSON, index.BACKEND_MSGSPEC]
+
+
+def install_backend(monkeypatch, *, name: str, compatible: bool):
+    pytest.importorskip(name)
+    backend = index.JsonBackend(name=name, compatible=compatible)
+    monkeypatch.setattr(index, "get_backend", lambda: backend)
+    return backend
+
+
+class TestDumps:
+    @pytest.mark.parametrize("name", BACKENDS)
+    @pytest.mark.parametrize("indent", [True, False])
+    def test_compatible(self, monkeypatch, name, indent):
+        install_backend(monkeypatch, name=name, compatible=True)
+        actual = index.dumps(DATA, indent=indent, compact=True)
+        expected = json.dumps(DATA, indent=2 if indent else None, ensure_ascii=False)
+        assert actual == expected.encode()
+
+    @pytest.mark.parametrize("name", BACKENDS)
+    def test_compact(self, monkeypatch, name):
+        install_backend(monkeypatch, name=name, compatible=False)
+        actual = index.dumps(DATA, indent=True, compact=True)
+        assert b"\n" not in actual
+        assert b", " not in actual and b": " not in actual
+        assert json.loads(actual) == DATA
+
+    @pytest.mark.parametrize("name", BACKENDS)
+    def test_indent(self, monkeypatch, name):
+        install_backend(monkeypatch, name=name, compatible=False)
+        actual = index.dumps(DATA, indent=True)
+        assert b'\n  "layers": [' in actual
+        assert json.loads(actual) == DATA
+
+    @pytest.mark.parametrize("name", BACKENDS)
+    def test_default(self, monkeypatch, name):
+        install_backend(monkeypatch, name=name, compatible=False)
+        actual = index.dumps({"count": Decimal("3")}, default=str)
+        assert json.loads(actual) == {"count": "3"}
+
+    @pytest.mark.parametrize("name", BACKENDS)
+    @pytest.mark.parametrize("indent", [True, False])
+    def test_default_same_shape(self, monkeypatch, name, indent):
+        # DynamoDB items hold Decimal and set, every backend calls default
+        install_backend(monkeypatch, name=name, compatible=False)
+        data = {"count": Decimal("3"), "regions": {"us-east-1"}}
+        actual = index.dumps(
+            data,
+            indent=indent,
+            default=lambda x: {"type": type(x).__name__, "value": str(x)},
+        )
+        assert json.loads(actual) == {
+            "count": {"type": "Decimal", "value": "3"},
+            "regions": {"type": "set", "value": "{'us-east-1'}"},
+        }
+
+    @pytest.mark.parametrize("name", BACKENDS)
+    @pytest.mark.parametrize("indent", [True, False])
+    def test_same_bytes(self, monkeypatch, name, indent):
+        install_backend(monkeypatch, name=name, compatible=False)
+        actual = index.dumps(DATA, indent=indent)
+        install_backend(monkeypatch, name=index.BACKEND_JSON, compatible=False)
+        assert actual == index.dumps(DATA, indent=indent)
+
+
+class TestLoadFile:
+    @pytest.mark.parametrize("name", BACKENDS)
+    @pytest.mark.parametrize("threshold", [0, index.MMAP_THRESHOLD])
+    def test_normal(self, monkeypatch, tmp_path, name, threshold):
+        install_backend(monkeypatch, name=name, compatible=False)
+        monkeypatch.setattr(index, "MMAP_THRESHOLD", threshold)
+        path = tmp_path / "data.json"
+        index.dump_file(str(path), DATA, indent=True)
+
+        actual = index.load_file(str(path))
+        assert actual == DATA
+
+
+class TestJsonBackend:
+    def test_error(self):
+        with pytest.raises(ValueError):
+            index.JsonBackend(name="simplejson", compatible=False)
@@ -0,0 +1,37 @@
+#!/usr/bin/env bash
+
+set -xeuo pipefail
+
+usage() {
+  cat <<'EOT'
+upload_artifact.sh <File> <S3 URI>
+
+  <File> and the <File>.gz / <File>.zst written next to it. The variants get
+  their Content-Encoding, every object gets the sha256 of <File>.sha256 as
+  x-amz-meta-sha256
+EOT
+}
+
+if [[ $# -ne 2 ]]; then
+  usage
+  exit 1
+fi
+
+file="$1"
+uri="$2"
+
+metadata=()
+if [[ -f "${file}.sha256" ]]; then
+  metadata=(--metadata "sha256=$(cut -d ' ' -f 1 "${file}.sha256")")
+fi
+
+# the variants before the plain file, which is what clients poll
+if [[ -f "${file}.gz" ]]; then
+  aws s3 cp "${file}.gz" "${uri}.gz" \
+    --content-type application/json --content-encoding gzip "${metadata[@]}"
+fi
+if [[ -f "${file}.zst" ]]; then
+  aws s3 cp "${file}.zst" "${uri}.zst" \
+    --content-type application/json --content-encoding zstd "${metadata[@]}"
+fi
+aws s3 cp "$file" "$uri" --content-type application/json "${metadata[@]}"